@@ -0,0 +1,201 @@
+"""
+End-to-end load/latency benchmark for the tool runner.
+
+Drives the FastAPI app from main.py in-process (through httpx's ASGI
+transport, lifespan included) or a running server via --url, and reports
+throughput and p50/p95/p99 latency per scenario.
+
+    python -m bench.load                          # in-process, all scenarios
+    python -m bench.load --url http://127.0.0.1:8000 --concurrency 32
+    python -m bench.load --out bench/results.json
+    python -m bench.load --baseline bench/baseline.json --max-regression 0.2
+
+With --baseline the run fails (exit 1) when a scenario's p95 latency or
+throughput is worse than the baseline by more than --max-regression.
+Requires httpx (pip install httpx); it is not a runtime dependency.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MACRAME_PARAMS = {
+    "sample.k_length": 10,
+    "sample.rope_used": 44,
+    "sample.width": 4,
+    "sample.ropes": 8,
+    "sample.attached_length": 4,
+    "sample.fringe_length": 2,
+    "target.total_length": 100,
+    "target.min_width": 6,
+    "settings.safety_margin": 10,
+    "settings.uom": "cm",
+}
+
+
+def _uncached_params(i: int) -> dict:
+    # vary the target so the result cache cannot answer
+    return {**MACRAME_PARAMS, "target.total_length": 50 + (i % 100000) / 100}
+
+
+# name -> (method, path, json body factory taking a request counter, expected status)
+SCENARIOS = {
+    "health": ("GET", "/health", None, 200),
+    "compute": ("POST", "/run/macrametool", lambda i: {"params": MACRAME_PARAMS}, 200),
+    "compute_uncached": ("POST", "/run/macrametool", lambda i: {"params": _uncached_params(i)}, 200),
+    "schema_mode": ("POST", "/run/macrametool", lambda i: {"params": {"mode": "schema"}}, 200),
+    "schema_get": ("GET", "/schema/macrametool", None, 200),
+    "invalid_input": ("POST", "/run/macrametool", lambda i: {"params": {"sample.k_length": "x"}}, 200),
+    "unknown_site": ("POST", "/run/does_not_exist", lambda i: {"params": {}}, 404),
+}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int, warmup: int) -> dict:
+    method, path, body, expected = SCENARIOS[name]
+    counter = itertools.count()
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        i = next(counter)
+        started = time.perf_counter()
+        resp = await client.request(method, path, json=body(i) if body else None)
+        elapsed = time.perf_counter() - started
+        if resp.status_code != expected:
+            failures += 1
+        return elapsed
+
+    for _ in range(warmup):
+        await one()
+
+    remaining = itertools.count()
+
+    async def worker():
+        while next(remaining) < requests:
+            latencies.append(await one())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda s: round(s * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "failures": failures,
+        "seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+async def run_all(args) -> dict:
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.url, timeout=30))
+        else:
+            sys.path.insert(0, str(ROOT))
+            # every in-process request comes from one client; measure the app, not its rate limits
+            os.environ.setdefault("SITE_RATE", "0")
+            os.environ.setdefault("CLIENT_RATE", "0")
+            import main
+
+            await stack.enter_async_context(main.lifespan(main.app))
+            transport = httpx.ASGITransport(app=main.app)
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30)
+            )
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, name, args.requests, args.concurrency, args.warmup)
+            print(_format_row(name, results[name]), flush=True)
+    return {
+        "meta": {
+            "target": args.url or "in-process",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "scenarios": results,
+    }
+
+
+def _format_row(name: str, r: dict) -> str:
+    return (
+        f"{name:<18} {r['throughput_rps']:>9.1f} req/s  "
+        f"p50 {r['p50_ms']:>8.3f} ms  p95 {r['p95_ms']:>8.3f} ms  p99 {r['p99_ms']:>8.3f} ms  "
+        f"fail {r['failures']}"
+    )
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """Return human-readable regressions of current vs baseline."""
+    problems = []
+    for name, cur in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            problems.append(f"{name}: p95 {cur['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            problems.append(f"{name}: {cur['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a previous results JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_all(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2) + "\n")
+
+    failed = [n for n, r in results["scenarios"].items() if r["failures"]]
+    if failed:
+        print(f"unexpected status codes in: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
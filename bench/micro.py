@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks for the functions that do the actual work: the macrame
+tool's calculate_outcome, _denest_params and _validate, and the justsaying
+renderer's wrap, draw_text_block, full render_image and image encoding.
+
+Inputs are synthetic (short and very long sayings, flat and nested params)
+and everything runs offline. The suite sets FONT_FALLBACK=1, so when the
+Noto fonts are not checked out the renderer draws with Pillow's bundled
+font instead (a production render would fail); compare baselines taken
+with the same fonts.
+
+    python -m bench.micro                                # all benchmarks
+    python -m bench.micro --only wrap draw               # names containing these
+    python -m bench.micro --out bench/micro-baseline.json
+    python -m bench.micro --baseline bench/micro-baseline.json --max-regression 0.2
+
+Each benchmark reports ops/sec (best of --repeat timed batches, each at
+least --min-time seconds) and, from a separate tracemalloc pass, the peak
+and retained bytes per call (Python allocations; Pillow's own C buffers are
+not traced). With --baseline the run fails (exit 1) when a
+benchmark's ops/sec drops, or its peak allocation grows, by more than
+--max-regression against the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SHORT_SAYING = {
+    "text": "Wie niet waagt, die niet wint.",
+    "translation": "Nothing ventured, nothing gained.",
+}
+
+LONG_SAYING = {
+    "text": " ".join(["Beter een vogel in de hand dan tien in de lucht, zei de oude visser"] * 12),
+    "translation": " ".join(["A bird in the hand is worth two in the bush, said the old fisherman"] * 6),
+}
+
+MACRAME_NESTED = {
+    "sample": {"k_length": 10, "rope_used": 44, "width": 4, "ropes": 8, "attached_length": 4, "fringe_length": 2},
+    "target": {"total_length": 100, "min_width": 6},
+    "settings": {"safety_margin": 10, "uom": "cm"},
+}
+
+MACRAME_FLAT = {
+    f"{section}.{key}": value for section, fields in MACRAME_NESTED.items() for key, value in fields.items()
+}
+
+
+def _benchmarks() -> Dict[str, Callable[[], None]]:
+    """name -> zero-argument callable doing one operation."""
+    sys.path.insert(0, str(ROOT))
+    # measure the code paths even where the font files are not checked out
+    os.environ.setdefault("FONT_FALLBACK", "1")
+    from PIL import ImageDraw
+
+    from sites.justsaying import render_post as rp
+    from sites.macrametool import tool
+
+    benches: Dict[str, Callable[[], None]] = {}
+
+    # calculate_outcome fills in target fields, so it gets a fresh copy like a request would
+    typed, _errors = tool.VALIDATOR.validate(MACRAME_NESTED)
+    benches["macrame.calculate_outcome"] = lambda: tool.calculate_outcome(
+        {"sample": typed["sample"], "target": dict(typed["target"]), "settings": typed["settings"]}
+    )
+    for shape, params in (("flat", MACRAME_FLAT), ("nested", MACRAME_NESTED)):
+        benches[f"macrame._denest_params[{shape}]"] = lambda p=params: tool._denest_params(p)
+        benches[f"macrame._validate[{shape}]"] = lambda p=params: tool._validate(p)
+
+    title_font, sub_font, _credit_font = rp.fonts()
+    max_width = rp.W - 2 * rp.M
+    canvas = rp.base_template().copy()
+    draw = ImageDraw.Draw(canvas)
+    # the uncached layout: what a saying costs the first time it is wrapped
+    layout = rp.layout_lines.__wrapped__
+    for size, row in (("short", SHORT_SAYING), ("long", LONG_SAYING)):
+        text = row["text"]
+        benches[f"render.wrap[{size}]"] = lambda t=text: layout(t, title_font, max_width)
+        benches[f"render.draw_text_block[{size}]"] = lambda t=text: rp.draw_text_block(
+            draw, t, title_font, rp.M, 0, max_width, rp.PALETTE["ink"]
+        )
+        benches[f"render.render_image[{size}]"] = lambda r=row: rp.render_image(r)
+
+    image = rp.render_image(SHORT_SAYING)
+    for fmt in rp.FORMATS:
+        benches[f"render.save[{fmt}]"] = lambda f=fmt: rp.encode_image(image, f, 0)
+    return benches
+
+
+def time_ops(fn: Callable[[], None], min_time: float, repeat: int) -> Tuple[float, int]:
+    """Best ops/sec over `repeat` batches, each sized to run at least `min_time`."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return loops / best, loops
+
+
+def measure_allocations(fn: Callable[[], None], calls: int) -> Dict[str, int]:
+    """Peak bytes above the starting point during one call, and bytes still held per call after `calls`."""
+    fn()  # populate caches outside the measurement
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        start, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            fn()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": max(peak - before, 0), "retained_bytes_per_call": max((after - start) // calls, 0)}
+
+
+def run_all(args) -> dict:
+    benches = _benchmarks()
+    names = [n for n in benches if not args.only or any(o in n for o in args.only)]
+    results = {}
+    for name in names:
+        fn = benches[name]
+        ops, loops = time_ops(fn, args.min_time, args.repeat)
+        results[name] = {
+            "ops_per_sec": round(ops, 1),
+            "us_per_op": round(1e6 / ops, 3),
+            "loops": loops,
+            **measure_allocations(fn, args.alloc_calls),
+        }
+        print(_format_row(name, results[name]), flush=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "benchmarks": results,
+    }
+
+
+def _format_row(name: str, r: dict) -> str:
+    return (
+        f"{name:<38} {r['ops_per_sec']:>12.1f} ops/s  {r['us_per_op']:>12.3f} us/op  "
+        f"peak {r['peak_bytes']:>10} B  retained {r['retained_bytes_per_call']:>6} B/call"
+    )
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Return human-readable regressions of current vs baseline."""
+    problems = []
+    for name, cur in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+        if base["ops_per_sec"] and cur["ops_per_sec"] < base["ops_per_sec"] * (1 - max_regression):
+            problems.append(f"{name}: {cur['ops_per_sec']} ops/s vs baseline {base['ops_per_sec']} ops/s")
+        # small peaks fluctuate by a few hundred bytes (interned strings, free lists); ignore those
+        if cur["peak_bytes"] > max(base["peak_bytes"] * (1 + max_regression), base["peak_bytes"] + 1024):
+            problems.append(f"{name}: peak {cur['peak_bytes']} B vs baseline {base['peak_bytes']} B")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains any of these")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed batch")
+    parser.add_argument("--repeat", type=int, default=5, help="timed batches per benchmark (best is kept)")
+    parser.add_argument("--alloc-calls", type=int, default=20, help="calls in the tracemalloc pass")
+    parser.add_argument("--out", help="write results JSON here (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="compare against a previous results JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_all(args)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
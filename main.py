@@ -1,10 +1,149 @@
-from typing import Any, Dict
-from fastapi import FastAPI, HTTPException
+import time
+_BOOT = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.requests import HTTPConnection
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
-import importlib
+import asyncio
+import copy
+import json
+import os
+
+from runner import metrics
+from runner.admission import AdmissionController, Rejected
+from runner.cache import canonical_key
+from runner.content import ContentInvalid, ContentNotFound, ContentStore, pick_encoding
+from runner.execution import ToolExecutor, ToolTimeout
+from runner.http import conditional_response, error_envelope, etag_matches, json_bytes, json_response, tool_envelope
+from runner.live import LiveHub
+from runner.registry import SiteNotFound, SiteRegistry, SiteTool, ToolInvalid
+from runner.renders import MEDIA_TYPES, JustSayingRenderer, RenderUnavailable, RowNotFound
+from runner.startup import Startup
+from runner.timing import ServerTimingMiddleware, stage
+
+startup = Startup()
+startup.record("imports", time.perf_counter() - _BOOT)
+
+registry = SiteRegistry()
+content = ContentStore(registry.sites_dir)
+renderer = JustSayingRenderer()
+
+# Sync tools run in their own bounded pool; each site gets SITE_CONCURRENCY
+# slots (or the tool's MAX_CONCURRENCY) and TOOL_TIMEOUT seconds (or TIMEOUT).
+# Tools with EXECUTION = "process" use PROCESS_WORKERS worker processes, each
+# recycled after PROCESS_MAX_TASKS tasks to cap memory growth.
+executor = ToolExecutor(
+    workers=int(os.getenv("TOOL_WORKERS", "8")),
+    site_concurrency=int(os.getenv("SITE_CONCURRENCY", "4")),
+    timeout=float(os.getenv("TOOL_TIMEOUT", "10")),
+    process_workers=int(os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 1))),
+    max_tasks_per_child=int(os.getenv("PROCESS_MAX_TASKS", "100")),
+    helper_workers=int(os.getenv("RENDER_WORKERS", "2")),
+)
+
+# Set TOOL_RELOAD=1 to pick up edited sites/*/tool.py without restarting uvicorn.
+TOOL_RELOAD = os.getenv("TOOL_RELOAD", "") == "1"
+TOOL_RELOAD_INTERVAL = float(os.getenv("TOOL_RELOAD_INTERVAL", "2"))
+
+# Admission control for /run: ADMIT_MAX_ACTIVE requests are served at once and
+# up to ADMIT_MAX_QUEUE wait, each at most ADMIT_MAX_WAIT seconds; beyond that
+# requests get 503 + Retry-After straight away. SITE_RATE / CLIENT_RATE are
+# token-bucket limits in requests per second (0 = unlimited) answered with 429.
+# Once queued requests have been waiting ADMIT_SHED_WAIT seconds on average,
+# new arrivals that would queue are turned away too.
+admission = AdmissionController(
+    max_active=int(os.getenv("ADMIT_MAX_ACTIVE", "16")),
+    max_queue=int(os.getenv("ADMIT_MAX_QUEUE", "64")),
+    max_wait=float(os.getenv("ADMIT_MAX_WAIT", "2")),
+    shed_wait=float(os.getenv("ADMIT_SHED_WAIT", "0.5")),
+    site_rate=float(os.getenv("SITE_RATE", "50")),
+    site_burst=float(os.getenv("SITE_BURST", "100")),
+    ip_rate=float(os.getenv("CLIENT_RATE", "10")),
+    ip_burst=float(os.getenv("CLIENT_BURST", "20")),
+)
+
+# Live recalculation (/live/{site}): recompute once the form has been quiet for
+# LIVE_DEBOUNCE seconds, but at least every LIVE_MAX_DELAY while it keeps changing.
+LIVE_DEBOUNCE = float(os.getenv("LIVE_DEBOUNCE", "0.05"))
+LIVE_MAX_DELAY = float(os.getenv("LIVE_MAX_DELAY", "0.25"))
+live = LiveHub(max_sessions=int(os.getenv("LIVE_MAX_SESSIONS", "200")))
+
+# Renders (Pillow drawing, PNG optimisation) run on RENDER_WORKERS helper threads
+# of their own, behind a separate admission queue of RENDER_QUEUE requests that
+# wait at most RENDER_MAX_WAIT seconds, so image bursts cannot starve the tools.
+render_admission = AdmissionController(
+    max_active=int(os.getenv("RENDER_WORKERS", "2")),
+    max_queue=int(os.getenv("RENDER_QUEUE", "16")),
+    max_wait=float(os.getenv("RENDER_MAX_WAIT", "5")),
+    ip_rate=float(os.getenv("CLIENT_RATE", "10")),
+    ip_burst=float(os.getenv("CLIENT_BURST", "20")),
+)
+
+# Behind a reverse proxy the connecting address is the proxy's. FORWARDED_HOPS
+# is the number of proxies in front of the app (1 on Render): the client is the
+# address the outermost one saw, that many entries from the right of
+# X-Forwarded-For. Entries further left come from the client and are ignored.
+# 0 = use the connecting address.
+FORWARDED_HOPS = int(os.getenv("FORWARDED_HOPS", "0"))
+
+# WARMUP=0 skips exercising tools at startup (/ready then follows discovery).
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+# Browsers/CDNs may reuse a schema this long before revalidating with If-None-Match.
+SCHEMA_MAX_AGE = int(os.getenv("SCHEMA_MAX_AGE", "300"))
+CONTENT_MAX_AGE = int(os.getenv("CONTENT_MAX_AGE", "60"))
+RENDER_MAX_AGE = int(os.getenv("RENDER_MAX_AGE", "3600"))
+
+async def warm_up():
+    """
+    Exercise every tool once with its WARMUP_PARAMS (if it declares any) so
+    lazy imports, thread/process pools and caches are hot before /ready
+    reports success. Runs in the background; /health answers meanwhile.
+    """
+    for tool in registry.tools():
+        if tool.run is None:
+            continue
+        with startup.timed(f"warmup.{tool.site}"):
+            for params in getattr(tool.module, "WARMUP_PARAMS", ()) if WARMUP else ():
+                try:
+                    # deep copy: tools may mutate their params
+                    await executor.run(tool, copy.deepcopy(params))
+                except Exception as e:
+                    startup.errors[f"warmup.{tool.site}"] = str(e)
+    startup.mark_ready()
 
-app = FastAPI(title="Microsites Tool Runner")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup.timed("registry.discover"):
+        registry.discover()
+    for tool in registry.tools():
+        startup.record(f"import.{tool.site}", tool.import_seconds)
+    with startup.timed("executor.start"):
+        executor.start(process_tools=[t for t in registry.tools() if t.run is not None and t.execution == "process"])
+    if TOOL_RELOAD:
+        registry.start_watching(TOOL_RELOAD_INTERVAL)
+    admission.reset()
+    render_admission.reset()
+    warming = asyncio.create_task(warm_up())
+    yield
+    warming.cancel()
+    registry.stop_watching()
+    executor.shutdown()
+
+app = FastAPI(title="Microsites Tool Runner", lifespan=lifespan)
+
+# Every response carries a Server-Timing header. ?profile=1 returns a sampled
+# profile of the request instead, but only with X-Profile-Token: PROFILE_TOKEN
+# (profiling is refused while PROFILE_TOKEN is unset).
+app.add_middleware(
+    ServerTimingMiddleware,
+    profile_token=os.getenv("PROFILE_TOKEN", ""),
+    profile_interval=float(os.getenv("PROFILE_INTERVAL", "0.001")),
+)
 
 # TEMP: allow all origins during testing; we'll lock this down later.
 app.add_middleware(
@@ -23,33 +162,325 @@ class ToolResponse(BaseModel):
     result: Dict[str, Any] | None = None
     error: str | None = None
 
+class BatchToolRequest(BaseModel):
+    params: List[Dict[str, Any]] = []
+
+# Upper bound on items per batch call so one request cannot monopolise the instance.
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "200"))
+# A batch is rate-limited as BATCH_COST requests whatever its size: it stands in
+# for the many calls one page view would otherwise make. Checked against
+# CLIENT_BURST / SITE_BURST here, since a larger cost could never be admitted.
+BATCH_COST = float(os.getenv("BATCH_COST", "2"))
+admission.check_cost(BATCH_COST)
+
+# /health and /ready are async so they never wait for a threadpool worker, and
+# they bypass admission control: a busy instance is still a live one.
+
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness, separate from /health: 503 until the startup warm-up is done."""
+    report = startup.report()
+    return JSONResponse(report, status_code=200 if startup.ready else 503)
+
+@app.get("/sites")
+def list_sites():
+    return registry.listing()
+
+@app.get("/admission")
+async def admission_stats():
+    """Current admission queue state and rejection counts."""
+    return admission.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of request, error, import and cache metrics."""
+    return PlainTextResponse(metrics.render(registry.tools()), media_type="text/plain; version=0.0.4")
+
+def load_site(site: str) -> SiteTool:
+    """Look up the preloaded sites.<site>.tool, mapping lookup failures to HTTP errors."""
+    try:
+        return registry.entry(site)
+    except SiteNotFound:
+        metrics.ERRORS.inc(site=metrics.UNKNOWN_SITE, kind="not_found")
+        raise HTTPException(status_code=404, detail=f"Site '{site}' not found")
+    except ToolInvalid as e:
+        metrics.ERRORS.inc(site=site, kind="missing_run")
+        raise HTTPException(status_code=500, detail=str(e))
+
 def load_tool(site: str):
     """
-    Dynamically import sites.<site>.tool and return its `run` function.
+    Return the preloaded `run` function of sites.<site>.tool from the registry.
     Expect: a callable run(params: dict) -> dict
     """
+    return load_site(site).run
+
+def _is_valid_result(tool: SiteTool, result: Any) -> bool:
+    if isinstance(result, dict):
+        return True
+    # pre-serialized payloads must at least look like a JSON object
+    return tool.preserialized and isinstance(result, (bytes, bytearray)) and result[:1] == b"{"
+
+async def call_tool(tool: SiteTool, params: Dict[str, Any]) -> Dict[str, Any] | bytes:
+    """
+    Invoke a tool's run(params) through the executor and check it honoured
+    the dict contract (or returned JSON bytes, for PRESERIALIZED tools).
+    With a cache (tools declaring CACHEABLE = True) identical params are
+    answered from memory; exceptions are never cached. Tools declaring
+    COALESCE = True also share one run between identical concurrent calls,
+    which all get its result or its exception.
+    """
+    params = params or {}
+    cache = tool.cache
+    key = None
+    if cache is not None or tool.flights is not None:
+        # key before running: tools may mutate the params they are given
+        with stage("cache"):
+            key = canonical_key(params)
+            result = cache.get(key) if cache is not None else None
+        if result is not None:
+            if isinstance(result, dict) and result.get("ok") is False:
+                metrics.ERRORS.inc(site=tool.site, kind="invalid_input")
+            return result
+    if tool.flights is not None:
+        result = await tool.flights.do(key, lambda: execute_tool(tool, params, key))
+    else:
+        result = await execute_tool(tool, params, key)
+    if isinstance(result, dict) and result.get("ok") is False:
+        # tools report their own validation failures as {"ok": False, "error": ...}
+        metrics.ERRORS.inc(site=tool.site, kind="invalid_input")
+    return result
+
+async def execute_tool(tool: SiteTool, params: Dict[str, Any], key: str | None) -> Dict[str, Any] | bytes:
     try:
-        mod = importlib.import_module(f"sites.{site}.tool")
-    except ModuleNotFoundError:
-        raise HTTPException(status_code=404, detail=f"Site '{site}' not found")
-    if not hasattr(mod, "run") or not callable(getattr(mod, "run")):
-        raise HTTPException(status_code=500, detail=f"Tool for '{site}' missing callable run(params)")
-    return mod.run
+        with stage("tool"):
+            result = await executor.run(tool, params)
+        if not _is_valid_result(tool, result):
+            raise ValueError("Tool must return a dict")
+    except ToolTimeout:
+        metrics.ERRORS.inc(site=tool.site, kind="timeout")
+        raise
+    except Exception:
+        metrics.ERRORS.inc(site=tool.site, kind="tool_exception")
+        raise
+    if tool.cache is not None:
+        tool.cache.put(key, result)
+    return result
+
+@app.get("/schema/{site}")
+def get_site_schema(site: str, request: Request):
+    """
+    The tool's SCHEMA, serialized once when the tool was loaded. Answers
+    If-None-Match with 304 so unchanged schemas are not re-downloaded.
+    """
+    load_tool(site)
+    schema = registry.schema(site)
+    if schema is None:
+        raise HTTPException(status_code=404, detail=f"Tool for '{site}' has no SCHEMA")
+    body, etag = schema
+    return conditional_response(
+        request, body, etag, "application/json",
+        f"public, max-age={SCHEMA_MAX_AGE}, must-revalidate",
+    )
+
+@app.get("/content/{site}/{name}")
+def get_site_content(site: str, name: str, request: Request):
+    """
+    sites/<site>/<name>.json (about, affiliates, ...) from memory, reloaded
+    when the file changes, compressed when the client accepts it.
+    """
+    try:
+        entry = content.get(site, name)
+    except ContentNotFound:
+        raise HTTPException(status_code=404, detail=f"Content '{name}' for site '{site}' not found")
+    except ContentInvalid as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    body, etag, headers = entry.body, entry.etag, {"Vary": "Accept-Encoding"}
+    encoding = pick_encoding(request.headers.get("accept-encoding"), entry.encoded)
+    if encoding:
+        body, etag = entry.encoded[encoding]
+        headers["Content-Encoding"] = encoding
+    return conditional_response(
+        request, body, etag, "application/json",
+        f"public, max-age={CONTENT_MAX_AGE}", headers=headers, last_modified=entry.mtime,
+    )
+
+@app.get("/render/justsaying/{row_id}")
+async def render_justsaying(row_id: str, request: Request, format: str = "png"):
+    """
+    Render a saying straight into memory and return the image bytes, so
+    Instagram and preview pages can fetch it without the commit-then-fetch
+    round trip. The ETag is the post's content hash: a matching
+    If-None-Match gets a 304 without rendering.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MEDIA_TYPES)}")
+    try:
+        async with render_admission.admit("justsaying", client_ip(request)):
+            row, etag = await executor.offload(renderer.lookup, row_id, format)
+            headers = {"ETag": etag, "Cache-Control": f"public, max-age={RENDER_MAX_AGE}"}
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            body = await executor.offload(renderer.render, row, etag, format)
+    except RowNotFound:
+        raise HTTPException(status_code=404, detail=f"Saying '{row_id}' not found")
+    except RenderUnavailable as e:
+        metrics.ERRORS.inc(site="justsaying", kind="render_unavailable")
+        raise HTTPException(status_code=503, detail=f"Rendering unavailable: {e}")
+    except Rejected as e:
+        raise rejected("justsaying", e)
+    return Response(content=body, media_type=MEDIA_TYPES[format], headers=headers)
+
+def client_ip(conn: HTTPConnection) -> str:
+    if FORWARDED_HOPS > 0:
+        hops = [h.strip() for v in conn.headers.getlist("x-forwarded-for") for h in v.split(",") if h.strip()]
+        if len(hops) >= FORWARDED_HOPS:
+            return hops[-FORWARDED_HOPS]
+    return conn.client.host if conn.client else "unknown"
+
+def rejected(site: str, e: Rejected) -> HTTPException:
+    metrics.ERRORS.inc(site=site, kind="rate_limited" if e.status == 429 else "overloaded")
+    detail = "Too many requests" if e.status == 429 else "Server busy, try again shortly"
+    return HTTPException(status_code=e.status, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+def record_request(site: str, endpoint: str, started: float) -> None:
+    label = site if site in registry else metrics.UNKNOWN_SITE
+    metrics.REQUESTS.inc(site=label, endpoint=endpoint)
+    metrics.LATENCY.observe(time.perf_counter() - started, site=label, endpoint=endpoint)
+
+# The run endpoints keep ToolResponse as their documented model but return the
+# envelope pre-encoded (orjson when installed): the tool's dict is checked once
+# in call_tool and serialized once, instead of being validated again by FastAPI.
 
 @app.post("/run/{site}", response_model=ToolResponse)
-def run_site_tool(site: str, req: ToolRequest):
+async def run_site_tool(site: str, req: ToolRequest, request: Request):
+    started = time.perf_counter()
     try:
-        run = load_tool(site)
-        result = run(req.params or {})
-        if not isinstance(result, dict):
-            raise ValueError("Tool must return a dict")
-        return ToolResponse(ok=True, result=result)
+        with stage("load"):
+            tool = load_site(site)
+        async with admission.admit(site, client_ip(request)):
+            result = await call_tool(tool, req.params)
+        with stage("serialize"):
+            return json_response(tool_envelope(result))
     except HTTPException:
         raise
+    except Rejected as e:
+        raise rejected(site, e)
+    except ToolTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         # Keep errors tidy for the client
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        record_request(site, "run", started)
+
+@app.post("/run/{site}/batch", response_model=List[ToolResponse])
+async def run_site_tool_batch(site: str, req: BatchToolRequest, request: Request):
+    """
+    Run the site's tool once per params object in a single round-trip.
+    The tool is resolved once; a failing item is reported in its own
+    ToolResponse and does not affect the others.
+    """
+    if len(req.params) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_ITEMS} items)")
+    started = time.perf_counter()
+    try:
+        tool = load_site(site)
+
+        async def one(params):
+            try:
+                return tool_envelope(await call_tool(tool, params))
+            except Exception as e:
+                return error_envelope(str(e))
+
+        # one admission slot for the whole batch at a fixed rate cost;
+        # items share the site's concurrency limit like any other request
+        async with admission.admit(site, client_ip(request), cost=BATCH_COST):
+            items = await asyncio.gather(*(one(params) for params in req.params))
+        return json_response(b"[" + b",".join(items) + b"]")
+    except Rejected as e:
+        raise rejected(site, e)
+    finally:
+        record_request(site, "batch", started)
+
+@app.websocket("/live/{site}")
+async def live_site_tool(websocket: WebSocket, site: str):
+    """
+    Live recalculation for calculator forms over one WebSocket. The client
+    sends the form once ({"params": {...}}) and then only the fields that
+    change ({"set": {"sample.k_length": 12}}); the server debounces them,
+    recomputes through the tool's run (cache, coalescing and admission
+    included) and pushes {"rev", "changed", "removed"} with just the output
+    fields that differ from the previous push.
+    """
+    try:
+        tool = registry.entry(site)
+    except (SiteNotFound, ToolInvalid):
+        tool = None
+    if tool is None or tool.run is None:
+        await websocket.close(code=1008)  # policy violation: nothing to run here
+        return
+    session = live.open()
+    if session is None:
+        await websocket.close(code=1013)  # try again later
+        return
+    await websocket.accept()
+    client = client_ip(websocket)
+    dirty = asyncio.Event()
+
+    async def recompute():
+        loop = asyncio.get_running_loop()
+        while True:
+            await dirty.wait()
+            dirty.clear()
+            first = loop.time()
+            while loop.time() - first < LIVE_MAX_DELAY:
+                try:
+                    await asyncio.wait_for(dirty.wait(), min(LIVE_DEBOUNCE, LIVE_MAX_DELAY - (loop.time() - first)))
+                except asyncio.TimeoutError:
+                    break
+                dirty.clear()
+            rev, params = session.rev, copy.deepcopy(session.params)
+            started = time.perf_counter()
+            try:
+                async with admission.admit(site, client):
+                    result = await call_tool(tool, params)
+                output = json.loads(result) if isinstance(result, (bytes, bytearray)) else result
+            except Rejected as e:
+                metrics.ERRORS.inc(site=site, kind="rate_limited" if e.status == 429 else "overloaded")
+                await websocket.send_text(json_bytes({"rev": rev, "busy": True, "retry_after": e.retry_after}).decode())
+                await asyncio.sleep(e.retry_after)
+                dirty.set()
+                continue
+            except Exception as e:
+                output = {"ok": False, "error": str(e)}
+            finally:
+                record_request(site, "live", started)
+            changed, removed = session.diff(output)
+            # sent even when nothing changed: it tells the client rev has been computed
+            await websocket.send_text(json_bytes({"rev": rev, "changed": changed, "removed": removed}).decode())
+
+    worker = asyncio.create_task(recompute())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                # binary frames carry the same JSON, UTF-8 encoded
+                text = message.get("text")
+                if text is None:
+                    text = (message.get("bytes") or b"").decode("utf-8")
+                session.apply(json.loads(text))
+            except ValueError as e:
+                await websocket.send_text(json_bytes({"error": str(e)}).decode())
+                continue
+            dirty.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+        live.close()
@@ -0,0 +1 @@
+"""Support code for the tool runner in main.py (registry, execution, caching)."""
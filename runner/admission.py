@@ -0,0 +1,176 @@
+"""
+Admission control for the run endpoints: per-site and per-client token
+buckets, and a bounded queue in front of a fixed number of active requests.
+Requests that would only time out anyway are turned away at once with a
+Retry-After hint instead of piling up behind the ones being served.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from runner import timing
+
+
+class Rejected(Exception):
+    """Raised instead of admitting a request; maps to 429 (rate) or 503 (overload)."""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, n: float = 1.0) -> float:
+        """Take n tokens; returns 0 on success, else seconds until n are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+
+class Buckets:
+    """Token buckets per key (site or client IP), keeping at most `maxkeys` keys."""
+
+    def __init__(self, rate: float, burst: float, maxkeys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, n: float) -> None:
+        """ValueError if a cost of `n` could never be paid, even from a full bucket."""
+        if self.rate > 0 and n > self.burst:
+            raise ValueError(f"cost {n:g} exceeds the bucket burst of {self.burst:g}")
+
+    def take(self, key: str, n: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0  # unlimited
+        self.check(n)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.maxkeys:
+                # the least recently seen client has long since refilled anyway
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(n)
+
+
+class AdmissionController:
+    """
+    At most `max_active` admitted requests run at once; up to `max_queue`
+    more wait for a slot. A request is rejected immediately when its client
+    or site is over its rate (429), or, when it would have to queue, if the
+    queue is full or recent requests have been waiting longer than
+    `shed_wait` (503; default half of `max_wait`). A request that does wait
+    is given up after `max_wait` seconds (503).
+
+    Meant for the event loop thread only (no locking).
+    """
+
+    def __init__(
+        self,
+        max_active: int = 16,
+        max_queue: int = 64,
+        max_wait: float = 2.0,
+        shed_wait: Optional[float] = None,
+        site_rate: float = 0.0,
+        site_burst: float = 0.0,
+        ip_rate: float = 0.0,
+        ip_burst: float = 0.0,
+    ):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # below max_wait: waits are capped there, so the average never exceeds it
+        self.shed_wait = max_wait / 2 if shed_wait is None else shed_wait
+        self.sites = Buckets(site_rate, site_burst or max(site_rate, 1.0))
+        self.clients = Buckets(ip_rate, ip_burst or max(ip_rate, 1.0))
+        self.active = 0
+        self.waiting = 0
+        # exponentially weighted recent queueing delay, in seconds
+        self.recent_wait = 0.0
+        self.rejected: Dict[str, int] = {"site_rate": 0, "client_rate": 0, "queue_full": 0, "queue_slow": 0}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def check_cost(self, cost: float) -> None:
+        """ValueError unless requests of `cost` fit the client and site bursts."""
+        self.clients.check(cost)
+        self.sites.check(cost)
+
+    def _reject(self, status: int, reason: str, retry_after: float) -> Rejected:
+        self.rejected[reason] += 1
+        return Rejected(status, reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, site: str, client: str, cost: float = 1.0):
+        """Hold an active slot for the enclosed request, or raise Rejected."""
+        # client first, so one noisy client cannot spend the site's tokens
+        wait = self.clients.take(client, cost)
+        if wait:
+            raise self._reject(429, "client_rate", wait)
+        wait = self.sites.take(site, cost)
+        if wait:
+            raise self._reject(429, "site_rate", wait)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_active)
+        # counted rather than asking the semaphore, which does not see the
+        # arrivals of this same tick that have yet to reach acquire()
+        queued = self.active + self.waiting - self.max_active
+        if queued >= 0:
+            if queued >= self.max_queue:
+                raise self._reject(503, "queue_full", self.recent_wait or self.max_wait)
+            if self.recent_wait > self.shed_wait:
+                raise self._reject(503, "queue_slow", self.recent_wait)
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            with timing.stage("admit"):
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self._observe_wait(time.monotonic() - started)
+            raise self._reject(503, "queue_slow", self.max_wait)
+        finally:
+            self.waiting -= 1
+        self._observe_wait(time.monotonic() - started)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def _observe_wait(self, seconds: float) -> None:
+        self.recent_wait = 0.8 * self.recent_wait + 0.2 * seconds
+
+    def reset(self) -> None:
+        """Forget the loop-bound semaphore (call at the start of each app lifespan)."""
+        self._slots = None
+        self.active = self.waiting = 0
+        self.recent_wait = 0.0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "recent_wait_seconds": round(self.recent_wait, 4),
+            "rejected": dict(self.rejected),
+        }
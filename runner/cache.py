@@ -0,0 +1,150 @@
+import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_MISSING = object()
+
+
+def _flatten(params: Dict[str, Any], prefix: str, out: Dict[str, Any]) -> None:
+    for k, v in params.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            _flatten(v, f"{key}.", out)
+        else:
+            out[key] = v
+
+
+def flatten(params: Dict[str, Any]) -> Dict[str, Any]:
+    """{"sample": {"k_length": 10}} -> {"sample.k_length": 10}"""
+    flat: Dict[str, Any] = {}
+    _flatten(params or {}, "", flat)
+    return flat
+
+
+def canonical_key(params: Dict[str, Any]) -> str:
+    """
+    Stable cache key for a params dict. Nested sections are flattened to
+    dotted keys first, so {"sample": {"k_length": 10}} and
+    {"sample.k_length": 10} produce the same key.
+    """
+    return json.dumps(flatten(params), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def approx_size(value: Any, limit: float = math.inf) -> int:
+    """
+    Rough deep size in bytes: sys.getsizeof summed over nested dicts, lists
+    and tuples (shared objects are counted each time they appear, so this
+    errs high). Stops walking once the total passes `limit`.
+    """
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        total += sys.getsizeof(item)
+        if total > limit:
+            break
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return total
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a per-entry TTL for deterministic tool results.
+    Cached dicts are shared between callers and must be treated as read-only.
+
+    With `max_bytes` the entries' approximate sizes (see approx_size) are
+    bounded too, and a result larger than `max_entry_bytes` is not cached
+    at all, so a few huge results cannot crowd out memory.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, max_bytes: int = 0, max_entry_bytes: int = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes, max_bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.too_large = 0
+        self._data: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires, value, size = item
+                if expires >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.bytes -= size
+            self.misses += 1
+            return default
+
+    def put(self, key: str, value: Any) -> None:
+        size = 0
+        if self.max_bytes:
+            # sized outside the lock; the walk stops early for results that will be refused
+            size = approx_size(value, self.max_entry_bytes)
+            if size > self.max_entry_bytes:
+                with self._lock:
+                    self.too_large += 1
+                return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes and self.bytes > self.max_bytes):
+                _key, (_expires, _value, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "too_large": self.too_large,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_for_module(
+    mod, default_size: int, default_ttl: float, default_bytes: int = 0, default_entry_bytes: int = 0
+) -> Optional[ResultCache]:
+    """
+    Tool modules opt in with `CACHEABLE = True` and may override the bounds
+    with `CACHE_SIZE` / `CACHE_TTL` (seconds) / `CACHE_BYTES` / `CACHE_ENTRY_BYTES`.
+    """
+    if not getattr(mod, "CACHEABLE", False):
+        return None
+    return ResultCache(
+        maxsize=int(getattr(mod, "CACHE_SIZE", default_size)),
+        ttl=float(getattr(mod, "CACHE_TTL", default_ttl)),
+        max_bytes=int(getattr(mod, "CACHE_BYTES", default_bytes)),
+        max_entry_bytes=int(getattr(mod, "CACHE_ENTRY_BYTES", default_entry_bytes)),
+    )
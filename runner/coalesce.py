@@ -0,0 +1,68 @@
+"""
+Single-flight execution: concurrent calls with the same key share one
+in-flight run instead of each starting their own.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    `await flights.do(key, fn)` runs `fn()` once per key at a time; callers
+    arriving while it is in flight await the same result, or get the same
+    exception. Nothing is remembered once the run finishes (that is the
+    result cache's job).
+
+    The run is a task of its own, so a caller that is cancelled (e.g. its
+    client disconnected) does not take the run down for the others; only
+    when every caller has gone is the run cancelled too.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda t: self._finished(key, flight))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.task.cancelled():
+                raise
+            # this caller went away; abandon the run only if nobody else wants it
+            if flight.waiters == 1:
+                # forget it first, so a caller arriving meanwhile starts afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finished(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # retrieved here so an unawaited failure is not logged
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "followers": self.followers}
@@ -0,0 +1,109 @@
+"""
+In-memory store for per-site JSON copy (sites/<site>/<name>.json).
+
+Files are loaded on first request, kept with precomputed gzip (and brotli,
+when the optional `brotli` package is installed) variants, and reloaded
+when their mtime changes.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from runner.http import strong_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# below this size compression costs more than it saves
+MIN_COMPRESS_BYTES = 256
+
+
+class ContentNotFound(LookupError):
+    pass
+
+
+class ContentInvalid(ValueError):
+    pass
+
+
+@dataclass
+class ContentEntry:
+    body: bytes
+    etag: str
+    mtime: float
+    # encoding -> (body, etag)
+    encoded: Dict[str, Tuple[bytes, str]] = field(default_factory=dict)
+
+
+def _encode(body: bytes, etag: str) -> Dict[str, Tuple[bytes, str]]:
+    if len(body) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    # each representation needs its own strong validator
+    return {
+        enc: (data, etag[:-1] + f"-{enc}" + '"')
+        for enc, data in variants.items()
+        if len(data) < len(body)
+    }
+
+
+def pick_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Best of `available` ("br" over "gzip") that the client accepts with q > 0."""
+    if not accept_encoding or not available:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    for enc in ("br", "gzip"):
+        if enc in available and accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+class ContentStore:
+    def __init__(self, sites_dir: Path):
+        self.sites_dir = sites_dir
+        self._entries: Dict[Tuple[str, str], ContentEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, site: str, name: str) -> ContentEntry:
+        if not _NAME.match(site) or not _NAME.match(name):
+            raise ContentNotFound(f"{site}/{name}")
+        path = self.sites_dir / site / f"{name}.json"
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._entries.pop((site, name), None)
+            raise ContentNotFound(f"{site}/{name}")
+        entry = self._entries.get((site, name))
+        if entry is not None and entry.mtime == mtime:
+            return entry
+        with self._lock:
+            body = path.read_bytes()
+            try:
+                json.loads(body)
+            except ValueError as e:
+                raise ContentInvalid(f"{site}/{name}.json is not valid JSON: {e}")
+            etag = strong_etag(body)
+            entry = ContentEntry(body=body, etag=etag, mtime=mtime, encoded=_encode(body, etag))
+            self._entries[(site, name)] = entry
+            return entry
@@ -0,0 +1,159 @@
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from runner import timing, workers
+
+
+class ToolTimeout(TimeoutError):
+    pass
+
+
+class ToolExecutor:
+    """
+    Runs tool callables off the event loop. `async def run` tools are awaited
+    directly; sync tools go to a bounded thread pool that is separate from
+    the one serving plain FastAPI handlers, so /health never waits on a tool.
+    Tools declaring EXECUTION = "process" run in a pool of warm worker
+    processes instead, so CPU-bound work does not hold the server's GIL.
+    Each site gets its own concurrency limit and every call a deadline.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        site_concurrency: int = 4,
+        timeout: float = 10.0,
+        process_workers: int = 2,
+        max_tasks_per_child: int = 100,
+        helper_workers: int = 2,
+    ):
+        self.workers = workers
+        self.site_concurrency = site_concurrency
+        self.timeout = timeout
+        self.process_workers = process_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.helper_workers = helper_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._helpers: Optional[ThreadPoolExecutor] = None
+        self._procs = None  # ProcessPoolExecutor, created only if a tool needs it
+        self._warm: List[Tuple[str, str, float]] = []
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    def start(self, process_tools: Iterable[Any] = ()) -> None:
+        """
+        Create the pools. `process_tools` are registry entries whose modules
+        every worker process imports up front.
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tool")
+        if self._helpers is None:
+            self._helpers = ThreadPoolExecutor(max_workers=self.helper_workers, thread_name_prefix="helper")
+        self._warm = [(t.site, str(t.path), t.mtime) for t in process_tools]
+        if self._warm and self._procs is None:
+            self._start_processes()
+        # semaphores bind to the running loop, so start fresh with each app lifespan
+        self._slots = {}
+
+    def _start_processes(self) -> None:
+        # imported here: multiprocessing is only needed when a process tool exists
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn (not fork): workers must not inherit the server's threads and sockets
+        self._procs = ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=workers.warm,
+            initargs=(self._warm,),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+        for _ in range(self.process_workers):
+            self._procs.submit(workers.ping)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._helpers is not None:
+            self._helpers.shutdown(wait=False, cancel_futures=True)
+            self._helpers = None
+        if self._procs is not None:
+            self._procs.shutdown(wait=False, cancel_futures=True)
+            self._procs = None
+
+    def _slot(self, site: str, limit: Optional[int]) -> asyncio.Semaphore:
+        sem = self._slots.get(site)
+        if sem is None:
+            sem = self._slots[site] = asyncio.Semaphore(limit or self.site_concurrency)
+        return sem
+
+    def _submit(self, loop, tool, params) -> asyncio.Future:
+        if tool.execution != "process":
+            return loop.run_in_executor(self._pool, timing.bind(tool.run), params)
+        if self._procs is None:
+            self._start_processes()
+        from concurrent.futures.process import BrokenProcessPool
+
+        args = (tool.site, str(tool.path), tool.mtime, params)
+        try:
+            return loop.run_in_executor(self._procs, workers.run_tool, *args)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM); replace the pool once and retry
+            self._procs = None
+            self._start_processes()
+            return loop.run_in_executor(self._procs, workers.run_tool, *args)
+
+    async def offload(self, fn, *args) -> Any:
+        """
+        Run a blocking helper (not a tool, e.g. an image render) on its own
+        small pool, so helpers can never occupy the threads tools run on.
+        """
+        if self._helpers is None:
+            self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._helpers, timing.bind(fn), *args)
+
+    async def run(self, tool, params: Dict[str, Any]) -> Any:
+        """
+        Call tool.run(params) within the site's concurrency limit. Waiting for
+        a slot counts towards the deadline; ToolTimeout is raised once it passes.
+        """
+        if self._pool is None:
+            self.start()
+        site = tool.site
+        timeout = tool.timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        sem = self._slot(site, tool.max_concurrency)
+        try:
+            with timing.stage("queue"):
+                await asyncio.wait_for(sem.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeout(f"Tool for '{site}' is busy; no free slot within {timeout:g}s")
+
+        if inspect.iscoroutinefunction(tool.run) and tool.execution != "process":
+            try:
+                return await asyncio.wait_for(tool.run(params), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise ToolTimeout(f"Tool for '{site}' timed out after {timeout:g}s")
+            finally:
+                sem.release()
+
+        try:
+            fut = self._submit(loop, tool, params)
+        except Exception:
+            sem.release()
+            raise
+
+        def _done(f):
+            # a running tool cannot be interrupted; its slot frees when it actually finishes
+            sem.release()
+            if not f.cancelled():
+                f.exception()
+
+        fut.add_done_callback(_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise ToolTimeout(f"Tool for '{site}' timed out after {timeout:g}s")
@@ -0,0 +1,97 @@
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Union
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+
+def json_bytes(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # e.g. ints wider than 64 bits, which the stdlib encoder handles
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def tool_envelope(result: Union[dict, bytes]) -> bytes:
+    """
+    ToolResponse(ok=True, result=...) as JSON bytes, without a pydantic
+    round-trip. `result` is a dict or an already serialized JSON object
+    from a tool declaring PRESERIALIZED = True.
+    """
+    payload = result if isinstance(result, (bytes, bytearray)) else json_bytes(result)
+    return b'{"ok":true,"result":' + payload + b',"error":null}'
+
+
+def error_envelope(error: str) -> bytes:
+    return json_bytes({"ok": False, "result": None, "error": error})
+
+
+def json_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: float) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return int(last_modified) <= since
+
+
+def conditional_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    media_type: str,
+    cache_control: str,
+    headers: Optional[Dict[str, str]] = None,
+    last_modified: Optional[float] = None,
+) -> Response:
+    """
+    Serve `body` with validators, or an empty 304 when the client copy is
+    current. If-Modified-Since is only consulted without If-None-Match.
+    """
+    out = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        out["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if headers:
+        out.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        fresh = etag_matches(if_none_match, etag)
+    else:
+        fresh = last_modified is not None and not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    if fresh:
+        return Response(status_code=304, headers=out)
+    return Response(content=body, media_type=media_type, headers=out)
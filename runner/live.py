@@ -0,0 +1,105 @@
+"""
+State for the live recalculation channel (/live/{site}): the form a client
+is editing, applied one incremental update at a time, and the output it
+was last sent, so each push carries only the fields that changed.
+"""
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from runner.cache import flatten
+
+# Upper bound on form fields per session, so a client cannot grow its state unbounded.
+MAX_FIELDS = 500
+
+
+class LiveSession:
+    """
+    Client messages (JSON objects):
+
+      {"params": {...}}              replace the whole form
+      {"set": {"sample.k_length": 12}}
+                                     update fields, by dotted path or nested
+                                     sections; a null value removes the field
+
+    `rev` counts applied messages; pushes report the rev they were computed
+    from, so the client can tell when the output has caught up with its input.
+    """
+
+    def __init__(self):
+        self.params: Dict[str, Any] = {}
+        self.rev = 0
+        self._sent: Optional[Dict[str, Any]] = None
+
+    def apply(self, message: Any) -> None:
+        """
+        Apply one client message; ValueError if it is not understood, in
+        which case the session is left as it was.
+        """
+        if not isinstance(message, dict) or not ({"params", "set"} & message.keys()):
+            raise ValueError('Expected {"params": {...}} or {"set": {...}}')
+        if "params" in message:
+            if not isinstance(message["params"], dict):
+                raise ValueError("params must be an object")
+            params: Dict[str, Any] = {}
+            for path, value in flatten(message["params"]).items():
+                _assign(params, path, value)
+        else:
+            params = copy.deepcopy(self.params)
+        if "set" in message:
+            if not isinstance(message["set"], dict):
+                raise ValueError("set must be an object")
+            for path, value in flatten(message["set"]).items():
+                _assign(params, path, value)
+        if len(flatten(params)) > MAX_FIELDS:
+            raise ValueError(f"Too many fields (max {MAX_FIELDS})")
+        self.params = params
+        self.rev += 1
+
+    def diff(self, output: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Fields of `output` (flattened to dotted paths) that differ from the
+        previous push, and the paths that have disappeared since. The first
+        push reports every field.
+        """
+        flat = flatten(output)
+        sent = self._sent or {}
+        changed = {
+            k: v for k, v in flat.items()
+            if k not in sent or type(sent[k]) is not type(v) or sent[k] != v
+        }
+        removed = [k for k in sent if k not in flat]
+        self._sent = flat
+        return changed, removed
+
+
+def _assign(params: Dict[str, Any], path: str, value: Any) -> None:
+    *sections, key = path.split(".")
+    node = params
+    for section in sections:
+        child = node.get(section)
+        if not isinstance(child, dict):
+            if value is None:
+                return  # removing a field that is not there
+            child = node[section] = {}
+        node = child
+    if value is None:
+        node.pop(key, None)
+    else:
+        node[key] = value
+
+
+class LiveHub:
+    """Caps the number of concurrently open live sessions."""
+
+    def __init__(self, max_sessions: int = 200):
+        self.max_sessions = max_sessions
+        self.active = 0
+
+    def open(self) -> Optional[LiveSession]:
+        if self.active >= self.max_sessions:
+            return None
+        self.active += 1
+        return LiveSession()
+
+    def close(self) -> None:
+        self.active -= 1
@@ -0,0 +1,128 @@
+"""
+Minimal Prometheus text-format metrics. Counters and histograms are plain
+dicts behind one lock, cheap enough to stay on for every request.
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = _fmt_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {_fmt_value(cumulative)}")
+            cumulative += row[len(self.buckets)]
+            le = _fmt_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {_fmt_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(row[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(cumulative)}")
+        return lines
+
+
+def gauge(name: str, help: str, samples: Iterable[Tuple[Labels, float]]) -> List[str]:
+    """Render a gauge whose samples are computed at scrape time."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, v in samples:
+        lines.append(f"{name}{_fmt_labels(key)} {_fmt_value(v)}")
+    return lines
+
+
+REQUESTS = Counter("microsites_requests_total", "Tool runner requests by site and endpoint.")
+ERRORS = Counter(
+    "microsites_errors_total",
+    "Tool runner errors by site and kind (not_found, missing_run, tool_exception, timeout, invalid_input, "
+    "rate_limited, overloaded).",
+)
+LATENCY = Histogram("microsites_request_duration_seconds", "Tool runner request latency by site and endpoint.")
+
+# label used for requests to sites that do not exist, to keep cardinality bounded
+UNKNOWN_SITE = "_unknown"
+
+
+def render(tools) -> str:
+    """Full exposition for the registry's `tools` plus the request metrics."""
+    lines = REQUESTS.render() + ERRORS.render() + LATENCY.render()
+    lines += gauge(
+        "microsites_tool_import_seconds",
+        "Time spent importing each site's tool module at its last (re)load.",
+        [(_labels(site=t.site), t.import_seconds) for t in tools],
+    )
+    cached = [t for t in tools if t.cache is not None]
+    stats = [(t.site, t.cache.stats()) for t in cached]
+    lines += gauge("microsites_cache_hits", "Result cache hits since the tool was loaded.",
+                   [(_labels(site=s), st["hits"]) for s, st in stats])
+    lines += gauge("microsites_cache_misses", "Result cache misses since the tool was loaded.",
+                   [(_labels(site=s), st["misses"]) for s, st in stats])
+    lines += gauge("microsites_cache_hit_ratio", "Result cache hit ratio since the tool was loaded.",
+                   [(_labels(site=s), st["hit_rate"]) for s, st in stats])
+    lines += gauge("microsites_cache_entries", "Entries currently held in the result cache.",
+                   [(_labels(site=s), st["size"]) for s, st in stats])
+    lines += gauge("microsites_cache_bytes", "Approximate bytes held in the result cache.",
+                   [(_labels(site=s), st["bytes"]) for s, st in stats])
+    flights = [(t.site, t.flights.stats()) for t in tools if t.flights is not None]
+    lines += gauge("microsites_coalesced_calls", "Calls that shared an identical in-flight run since the tool was loaded.",
+                   [(_labels(site=s), st["followers"]) for s, st in flights])
+    return "\n".join(lines) + "\n"
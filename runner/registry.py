@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from runner.cache import ResultCache, cache_for_module
+from runner.coalesce import SingleFlight
+from runner.http import strong_etag
+from runner.workers import import_tool
+
+SITES_DIR = Path(__file__).resolve().parent.parent / "sites"
+
+# Defaults for tools that declare CACHEABLE = True without their own bounds.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# Memory bounds per tool cache (approximate bytes): the whole cache, and any one
+# result (larger ones, e.g. big sweeps, are recomputed rather than cached).
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_ENTRY_BYTES", str(512 * 1024)))
+
+
+class SiteNotFound(LookupError):
+    pass
+
+
+class ToolInvalid(RuntimeError):
+    pass
+
+
+@dataclass
+class SiteTool:
+    site: str
+    path: Path
+    mtime: float
+    module: Any = None
+    run: Optional[Callable[[dict], dict]] = None
+    error: Optional[str] = None
+    loaded_at: float = 0.0
+    cache: Optional[ResultCache] = None
+    schema_body: Optional[bytes] = None
+    schema_etag: Optional[str] = None
+    max_concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+    execution: str = "thread"
+    import_seconds: float = 0.0
+    preserialized: bool = False
+    flights: Optional[SingleFlight] = None
+
+
+class SiteRegistry:
+    """
+    Imports and validates every sites/*/tool.py once and hands out the cached
+    `run` callables. A tool that fails to import or has no callable run() is
+    kept in the listing with its error instead of failing on first use.
+    """
+
+    def __init__(self, sites_dir: Path = SITES_DIR):
+        self.sites_dir = sites_dir
+        self._tools: Dict[str, SiteTool] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _load(self, site: str, path: Path) -> SiteTool:
+        entry = SiteTool(site=site, path=path, mtime=path.stat().st_mtime, loaded_at=time.time())
+        started = time.perf_counter()
+        try:
+            mod = import_tool(site, path)
+        except Exception as e:
+            entry.error = f"Import failed: {e}"
+            return entry
+        finally:
+            entry.import_seconds = time.perf_counter() - started
+        run = getattr(mod, "run", None)
+        if not callable(run):
+            entry.error = f"Tool for '{site}' missing callable run(params)"
+        entry.module, entry.run = mod, run if callable(run) else None
+        # a reloaded tool gets a fresh cache, so stale results never outlive the code
+        entry.cache = cache_for_module(
+            mod, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_BYTES, RESULT_CACHE_ENTRY_BYTES
+        )
+        schema = getattr(mod, "SCHEMA", None)
+        if isinstance(schema, dict):
+            entry.schema_body = json.dumps(schema, separators=(",", ":")).encode()
+            entry.schema_etag = strong_etag(entry.schema_body)
+        # optional per-tool execution limits; the runner's defaults apply otherwise
+        entry.max_concurrency = getattr(mod, "MAX_CONCURRENCY", None)
+        entry.timeout = getattr(mod, "TIMEOUT", None)
+        # EXECUTION = "process" moves CPU-bound tools (e.g. Pillow rendering) to worker processes
+        entry.execution = getattr(mod, "EXECUTION", "thread")
+        # PRESERIALIZED = True lets run() return a JSON object as bytes
+        entry.preserialized = bool(getattr(mod, "PRESERIALIZED", False))
+        # COALESCE = True: identical concurrent calls share one run (only for idempotent tools)
+        if getattr(mod, "COALESCE", False):
+            entry.flights = SingleFlight()
+        return entry
+
+    def discover(self) -> List[SiteTool]:
+        """Scan sites/*/tool.py and (re)load anything new or changed on disk."""
+        found = {}
+        for path in sorted(self.sites_dir.glob("*/tool.py")):
+            found[path.parent.name] = path
+        with self._lock:
+            for site, path in found.items():
+                current = self._tools.get(site)
+                if current is not None and current.mtime == path.stat().st_mtime:
+                    continue
+                entry = self._load(site, path)
+                if current is not None and current.run is not None and entry.error:
+                    # keep serving the last good version; surface the error in the listing
+                    current.error = entry.error
+                    current.mtime = entry.mtime
+                    continue
+                self._tools[site] = entry
+            for site in set(self._tools) - set(found):
+                del self._tools[site]
+            return list(self._tools.values())
+
+    def entry(self, site: str) -> SiteTool:
+        """The loaded tool for `site`; raises SiteNotFound / ToolInvalid."""
+        entry = self._tools.get(site)
+        if entry is None:
+            path = self.sites_dir / site / "tool.py"
+            if not site.isidentifier() or not path.is_file():
+                raise SiteNotFound(site)
+            # site added after startup
+            self.discover()
+            entry = self._tools.get(site)
+            if entry is None:
+                raise SiteNotFound(site)
+        if entry.run is None:
+            raise ToolInvalid(entry.error or f"Tool for '{site}' missing callable run(params)")
+        return entry
+
+    def __contains__(self, site: str) -> bool:
+        return site in self._tools
+
+    def tools(self) -> List[SiteTool]:
+        return list(self._tools.values())
+
+    def get(self, site: str) -> Callable[[dict], dict]:
+        return self.entry(site).run
+
+    def module(self, site: str):
+        return self.entry(site).module
+
+    def schema(self, site: str):
+        """(body, etag) of the tool's SCHEMA serialized at load time, or None."""
+        entry = self.entry(site)
+        if entry.schema_body is None:
+            return None
+        return entry.schema_body, entry.schema_etag
+
+    def cache(self, site: str) -> Optional[ResultCache]:
+        entry = self._tools.get(site)
+        return entry.cache if entry is not None else None
+
+    def listing(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "site": t.site,
+                "ok": t.run is not None and t.error is None,
+                "error": t.error,
+                "loaded_at": t.loaded_at,
+                "cache": t.cache.stats() if t.cache is not None else None,
+                "coalesce": t.flights.stats() if t.flights is not None else None,
+            }
+            for t in sorted(self._tools.values(), key=lambda t: t.site)
+        ]
+
+    # ---------- optional hot reload ----------
+    def start_watching(self, interval: float = 2.0) -> None:
+        """Poll tool.py mtimes in a daemon thread and reload changed tools."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.discover()
+                except Exception:
+                    pass  # never let the watcher die on a bad scan
+
+        self._watcher = threading.Thread(target=loop, name="tool-reload", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
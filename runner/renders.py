@@ -0,0 +1,84 @@
+"""
+On-demand image rendering for justsaying posts, served from memory.
+
+The justsaying renderer (sites/justsaying/render_post.py) is imported
+lazily so the runner does not pay for Pillow until the first render.
+Its content hash (render_key) doubles as the ETag, so a conditional GET
+for an unchanged post is answered without drawing anything.
+"""
+import importlib
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from runner.cache import ResultCache
+
+RENDER_MEMORY_SIZE = int(os.getenv("RENDER_MEMORY_SIZE", "64"))
+
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class RowNotFound(LookupError):
+    pass
+
+
+class RenderUnavailable(RuntimeError):
+    """The renderer cannot draw at all on this instance (e.g. its fonts are missing)."""
+
+
+class JustSayingRenderer:
+    def __init__(self, maxsize: int = RENDER_MEMORY_SIZE):
+        self.cache = ResultCache(maxsize=maxsize, ttl=float("inf"))
+        self._module = None
+        self._store = None
+        # lookups run on several helper threads; only one may build the store
+        self._store_lock = threading.Lock()
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module("sites.justsaying.render_post")
+        return self._module
+
+    @property
+    def csv_path(self) -> str:
+        """
+        rp.CSV_PATH as given if it exists from the working directory, else
+        next to the site module (where the runner finds sites/justsaying/sayings.csv).
+        """
+        path = self.module.CSV_PATH
+        if os.path.exists(path):
+            return path
+        here = Path(self.module.__file__).resolve().parent
+        for candidate in (here / path, here / Path(path).name):
+            if candidate.is_file():
+                return str(candidate)
+        return path
+
+    def lookup(self, row_id: str, fmt: str) -> Tuple[dict, str]:
+        """(row, etag) for a post; cheap, no drawing."""
+        rp = self.module
+        with self._store_lock:
+            if self._store is None:
+                # an in-memory copy of the CSV: serving a GET never creates or writes files
+                self._store = rp.sayings_store.open_store(self.csv_path, db_path=":memory:")
+            else:
+                self._store.sync(self.csv_path)
+        row = self._store.get(row_id)
+        if row is None:
+            raise RowNotFound(row_id)
+        return row, '"' + rp.render_key(row, fmt, 0)[:32] + '"'
+
+    def render(self, row: dict, etag: str, fmt: str) -> bytes:
+        """Encoded image bytes, drawn in memory (never written to OUT_DIR)."""
+        body: Optional[bytes] = self.cache.get(etag)
+        if body is None:
+            rp = self.module
+            try:
+                image = rp.render_image(row)
+            except OSError as e:
+                raise RenderUnavailable(str(e)) from e
+            body = rp.encode_image(image, fmt, 0)
+            self.cache.put(etag, body)
+        return body
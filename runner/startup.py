@@ -0,0 +1,39 @@
+"""
+Startup bookkeeping: how long each import/initialization step took and
+whether the eager warm-up has finished (served by /ready).
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class Startup:
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready = False
+        self.ready_at: Optional[float] = None
+        self._created = time.perf_counter()
+
+    def record(self, step: str, seconds: float) -> None:
+        self.timings[step] = seconds
+
+    @contextmanager
+    def timed(self, step: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(step, time.perf_counter() - started)
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.ready_at = time.perf_counter() - self._created
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "ready_after_ms": round(self.ready_at * 1000, 1) if self.ready_at is not None else None,
+            "timings_ms": {k: round(v * 1000, 2) for k, v in self.timings.items()},
+            "errors": self.errors,
+        }
@@ -0,0 +1,229 @@
+"""
+Per-request stage timing, reported in a Server-Timing header, plus an
+opt-in sampling profiler for a single request.
+
+Code on the request path (the runner and the tools alike) marks stages with
+
+    from runner.timing import stage
+
+    with stage("validate"):
+        ...
+
+which is a no-op outside a request. Timings travel in a context variable, so
+they follow the request into the tool thread pool (see `bind`); tools running
+in worker processes are timed as a whole by the runner only.
+"""
+import contextvars
+import hmac
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+_current: contextvars.ContextVar[Optional["Timings"]] = contextvars.ContextVar("timings", default=None)
+
+# Server-Timing metric names are HTTP tokens
+_TOKEN_SAFE = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&'*+-.^_`|~")
+
+
+class Timings:
+    """Durations per stage name; repeated stages (e.g. batch items) are summed."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.threads = {threading.get_ident()}
+        self._totals: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            total, count = self._totals.get(name, (0.0, 0))
+            self._totals[name] = (total + seconds, count + 1)
+
+    def stages(self) -> List[Tuple[str, float, int]]:
+        with self._lock:
+            return [(name, total, count) for name, (total, count) in self._totals.items()]
+
+    def header(self) -> str:
+        parts = []
+        for name, total, count in self.stages():
+            name = "".join(c if c in _TOKEN_SAFE else "_" for c in name)
+            part = f"{name};dur={total * 1000:.3f}"
+            if count > 1:
+                part += f';desc="x{count}"'
+            parts.append(part)
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(parts)
+
+
+def current() -> Optional[Timings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as `name` for the current request, if any."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, time.perf_counter() - started)
+
+
+def bind(fn):
+    """
+    Wrap `fn` to run in a copy of the caller's context, so stages recorded
+    on another thread land in the caller's Timings (run_in_executor does
+    not propagate context variables on its own).
+    """
+    ctx = contextvars.copy_context()
+    timings = _current.get()
+
+    def call(*args):
+        if timings is not None:
+            timings.threads.add(threading.get_ident())
+        return ctx.run(fn, *args)
+
+    return call
+
+
+class Sampler:
+    """
+    Samples the stacks of the threads working on one request (the event loop
+    thread plus any thread that ran its tool) every `interval` seconds and
+    counts them as collapsed "outer;...;inner" stacks.
+    """
+
+    def __init__(self, timings: Timings, interval: float = 0.001):
+        self.timings = timings
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.timings.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top: int = 50) -> Dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": s, "count": n} for s, n in self.stacks.most_common(top)],
+        }
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware giving every HTTP request a Timings and adding its
+    Server-Timing header to the response.
+
+    `?profile=1` additionally samples the request and returns the profile
+    (with the original status, body and timings) as JSON instead of the
+    response. It is only honoured when `profile_token` is configured and the
+    request sends it in X-Profile-Token; otherwise the flag is refused with 403.
+    """
+
+    def __init__(self, app, profile_token: str = "", profile_interval: float = 0.001):
+        self.app = app
+        self.profile_token = profile_token
+        self.profile_interval = profile_interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = Timings()
+        token = _current.set(timings)
+        try:
+            if b"profile=1" in scope.get("query_string", b"") and _wants_profile(scope):
+                await self._profile(scope, receive, send, timings)
+                return
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.header().encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+    async def _profile(self, scope, receive, send, timings: Timings):
+        if not self._authorized(scope):
+            await _send_json(send, 403, {"detail": "Profiling is not enabled for this client"})
+            return
+        start: Dict = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        with Sampler(timings, self.profile_interval) as sampler:
+            await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        try:
+            response = json.loads(body) if body else None
+        except ValueError:
+            response = None  # not JSON (e.g. an image); the profile is what matters
+        await _send_json(send, 200, {
+            "status": start.get("status"),
+            "response": response,
+            "server_timing": timings.header(),
+            "profile": sampler.report(),
+        })
+
+    def _authorized(self, scope) -> bool:
+        if not self.profile_token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile-token":
+                return hmac.compare_digest(value, self.profile_token.encode())
+        return False
+
+
+def _wants_profile(scope) -> bool:
+    query = scope.get("query_string", b"").split(b"&")
+    return b"profile=1" in query
+
+
+async def _send_json(send, status: int, payload: Dict) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
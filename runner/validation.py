@@ -0,0 +1,123 @@
+"""
+Single-pass input validation compiled from a tool's INPUT_SCHEMA.
+
+Schema entries are the tuples site tools already use for Framer binding:
+
+    (section, key, type, required, hint[, constraints])
+
+`type` is "number", "integer", "string" or "select"; the optional
+constraints dict may hold "gt", "ge", "lt", "le" (numbers) and "options"
+(allowed values). Params may be nested ({"sample": {"k_length": 10}}) or
+flat ({"sample.k_length": 10}); the validator reads both, coerces every
+field and collects all errors instead of stopping at the first.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+MISSING = "Missing required field"
+
+_BOUNDS = (
+    ("gt", lambda v, b: v > b, ">"),
+    ("ge", lambda v, b: v >= b, ">="),
+    ("lt", lambda v, b: v < b, "<"),
+    ("le", lambda v, b: v <= b, "<="),
+)
+
+
+def _to_number(raw: Any):
+    if isinstance(raw, bool):
+        raise ValueError
+    if isinstance(raw, (int, float)):
+        return raw
+    text = str(raw).strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _to_integer(raw: Any) -> int:
+    value = _to_number(raw)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        value = int(value)
+    return value
+
+
+_COERCE: Dict[str, Tuple[Callable[[Any], Any], str]] = {
+    "number": (_to_number, "must be a number"),
+    "integer": (_to_integer, "must be a whole number"),
+    "string": (str, "must be text"),
+    "select": (lambda raw: raw, ""),
+}
+
+
+class _Field:
+    __slots__ = ("id", "section", "key", "required", "coerce", "type_error", "checks")
+
+    def __init__(self, section: str, key: str, typ: str, required: bool, constraints: Optional[dict]):
+        if typ not in _COERCE:
+            raise ValueError(f"Unsupported schema type '{typ}' for {section}.{key}")
+        self.id = f"{section}.{key}"
+        self.section, self.key, self.required = section, key, required
+        self.coerce, self.type_error = _COERCE[typ]
+        self.checks: List[Tuple[Callable[[Any], bool], str]] = []
+        constraints = constraints or {}
+        for name, test, symbol in _BOUNDS:
+            if name in constraints:
+                bound = constraints[name]
+                self.checks.append((lambda v, b=bound, t=test: t(v, b), f"{self.id} must be {symbol} {bound}"))
+        if "options" in constraints:
+            options = tuple(constraints["options"])
+            allowed = " or ".join(repr(o) for o in options)
+            self.checks.append((lambda v, o=options: v in o, f"{self.id} must be {allowed}"))
+
+
+class SchemaValidator:
+    """Compile once per tool (module level); call validate() per request."""
+
+    def __init__(self, schema: Iterable[tuple]):
+        self.fields = [
+            _Field(entry[0], entry[1], entry[2], entry[3], entry[5] if len(entry) > 5 else None)
+            for entry in schema
+        ]
+        self.sections = tuple(dict.fromkeys(f.section for f in self.fields))
+        self._by_id = {f.id: f for f in self.fields}
+
+    @staticmethod
+    def _check(f: _Field, raw: Any) -> Tuple[Any, Optional[str]]:
+        try:
+            value = f.coerce(raw)
+        except (TypeError, ValueError):
+            return None, f"{f.id} {f.type_error}"
+        for check, message in f.checks:
+            if not check(value):
+                return None, message
+        return value, None
+
+    def check(self, field_id: str, raw: Any) -> Tuple[Any, Optional[str]]:
+        """Coerce and check one value for `field_id` ("section.key"); returns (value, error)."""
+        return self._check(self._by_id[field_id], raw)
+
+    def validate(self, params: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, str]]]:
+        """
+        Return (data, errors). `data` is nested by section and holds the
+        coerced values; `errors` lists {"field", "error"} for every problem.
+        """
+        data: Dict[str, Dict[str, Any]] = {sec: {} for sec in self.sections}
+        errors: List[Dict[str, str]] = []
+        for f in self.fields:
+            section = params.get(f.section)
+            raw = section.get(f.key) if isinstance(section, dict) else None
+            if raw is None:
+                raw = params.get(f.id)
+            if raw is None or raw == "":
+                if f.required:
+                    errors.append({"field": f.id, "error": MISSING})
+                continue
+            value, error = self._check(f, raw)
+            if error:
+                errors.append({"field": f.id, "error": error})
+            else:
+                data[f.section][f.key] = value
+        return data, errors
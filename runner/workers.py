@@ -0,0 +1,52 @@
+"""
+Code that runs inside process-pool workers. Kept free of FastAPI/pydantic
+imports so spawning a worker only pays for the tools it actually serves.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+# (site, mtime) -> module, per worker process
+_modules: Dict[Tuple[str, float], Any] = {}
+
+
+def import_tool(site: str, path: Path):
+    """
+    Execute sites/<site>/tool.py into a fresh module object. The previous
+    module (if any) stays untouched, so callers still holding its `run`
+    finish on the old code.
+    """
+    name = f"sites.{site}.tool"
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    sys.modules[name] = mod
+    return mod
+
+
+def _module(site: str, path: str, mtime: float):
+    mod = _modules.get((site, mtime))
+    if mod is None:
+        # drop older versions of a reloaded tool
+        for key in [k for k in _modules if k[0] == site]:
+            del _modules[key]
+        mod = _modules[(site, mtime)] = import_tool(site, Path(path))
+    return mod
+
+
+def warm(tools: Iterable[Tuple[str, str, float]]) -> None:
+    """Pool initializer: import every process-backed tool before the first task."""
+    for site, path, mtime in tools:
+        try:
+            _module(site, path, mtime)
+        except Exception:
+            pass  # the task itself will surface the import error
+
+
+def ping() -> bool:
+    return True
+
+
+def run_tool(site: str, path: str, mtime: float, params: Dict[str, Any]) -> Any:
+    return _module(site, path, mtime).run(params)
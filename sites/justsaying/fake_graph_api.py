@@ -0,0 +1,113 @@
+"""
+Local stand-in for the parts of the Instagram Graph API the publisher uses,
+so the whole publish flow can run offline:
+
+    python fake_graph_api.py --port 8765 --fail-rate 0.2 --ready-after 2
+    GRAPH_API_BASE=http://127.0.0.1:8765/v21.0 RENDER_BASE_URL=... python publish_instagram.py --batch
+
+  POST /<ver>/<ig_user>/media           -> {"id": <container>}
+  GET  /<ver>/<container>?fields=...    -> {"status_code": IN_PROGRESS|FINISHED|PUBLISHED}
+  POST /<ver>/<ig_user>/media_publish   -> {"id": <media>}
+
+--fail-rate answers that fraction of calls with a transient Graph error
+(HTTP 500, is_transient=true) to exercise retries.
+"""
+import argparse, itertools, json, random, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class FakeGraphAPI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, fail_rate=0.0, ready_after=1):
+        super().__init__(addr, _Handler)
+        self.fail_rate = fail_rate
+        self.ready_after = ready_after
+        self.lock = threading.Lock()
+        self.ids = itertools.count(17900000000000000)
+        self.containers = {}  # id -> {"polls": int, "image_url": str, "caption": str}
+        self.published = []   # media ids, in order
+        self.calls = 0
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeGraphAPI
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _flaky(self):
+        srv = self.server
+        with srv.lock:
+            srv.calls += 1
+        if random.random() < srv.fail_rate:
+            self._send(500, {"error": {"message": "An unexpected error has occurred.", "code": 2, "is_transient": True}})
+            return True
+        return False
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+
+    def do_POST(self):
+        form = self._form()
+        if self._flaky():
+            return
+        parts = urlparse(self.path).path.strip("/").split("/")
+        srv = self.server
+        if len(parts) == 3 and parts[2] == "media":
+            if not form.get("image_url"):
+                return self._send(400, {"error": {"message": "image_url is required", "code": 100}})
+            with srv.lock:
+                cid = str(next(srv.ids))
+                srv.containers[cid] = {"polls": 0, "image_url": form["image_url"], "caption": form.get("caption", "")}
+            return self._send(200, {"id": cid})
+        if len(parts) == 3 and parts[2] == "media_publish":
+            with srv.lock:
+                c = srv.containers.get(form.get("creation_id"))
+                if c is None or c["polls"] < srv.ready_after:
+                    return self._send(400, {"error": {"message": "Media ID is not available", "code": 9007}})
+                mid = str(next(srv.ids))
+                c["published"] = True
+                srv.published.append(mid)
+            return self._send(200, {"id": mid})
+        self._send(404, {"error": {"message": "Unknown path", "code": 803}})
+
+    def do_GET(self):
+        if self._flaky():
+            return
+        parts = urlparse(self.path).path.strip("/").split("/")
+        srv = self.server
+        with srv.lock:
+            c = srv.containers.get(parts[-1]) if len(parts) == 2 else None
+            if c is None:
+                return self._send(404, {"error": {"message": "Unknown container", "code": 100}})
+            c["polls"] += 1
+            if c.get("published"):
+                status = "PUBLISHED"
+            else:
+                status = "FINISHED" if c["polls"] >= srv.ready_after else "IN_PROGRESS"
+        self._send(200, {"status_code": status, "id": parts[-1]})
+
+def serve(port=0, fail_rate=0.0, ready_after=1):
+    """Start the server in a daemon thread; returns it (port in server.server_port)."""
+    srv = FakeGraphAPI(("127.0.0.1", port), fail_rate=fail_rate, ready_after=ready_after)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Instagram Graph API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--ready-after", type=int, default=1, help="status polls before a container is FINISHED")
+    args = parser.parse_args()
+    srv = FakeGraphAPI(("127.0.0.1", args.port), fail_rate=args.fail_rate, ready_after=args.ready_after)
+    print(f"fake Graph API on http://127.0.0.1:{args.port}/v21.0")
+    srv.serve_forever()
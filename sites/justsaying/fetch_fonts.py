@@ -0,0 +1,47 @@
+"""
+Download the Noto fonts render_post.py draws with into assets/fonts (or
+FONT_DIR), skipping files that are already there. The Render build runs it
+so the tool runner's /render endpoint has its fonts:
+
+    python sites/justsaying/fetch_fonts.py
+"""
+import os, shutil, sys, urllib.request
+from pathlib import Path
+
+BASE = "https://github.com/notofonts/notofonts.github.io/raw/main/fonts"
+FONTS = {
+    "NotoSans-Regular.ttf": f"{BASE}/NotoSans/hinted/ttf/NotoSans-Regular.ttf",
+    "NotoSerif-Regular.ttf": f"{BASE}/NotoSerif/hinted/ttf/NotoSerif-Regular.ttf",
+}
+FONT_DIR = Path(os.getenv("FONT_DIR") or Path(__file__).resolve().parent / "assets" / "fonts")
+
+# sfnt magic numbers: TrueType, OpenType (CFF), legacy Apple TrueType
+SFNT_MAGIC = (b"\x00\x01\x00\x00", b"OTTO", b"true")
+
+def fetch(name, url):
+    path = FONT_DIR / name
+    if path.exists():
+        return False
+    tmp = path.with_suffix(".tmp")
+    with urllib.request.urlopen(url, timeout=60) as r, open(tmp, "wb") as f:
+        shutil.copyfileobj(r, f)
+    with open(tmp, "rb") as f:
+        if f.read(4) not in SFNT_MAGIC:
+            os.remove(tmp)
+            raise ValueError(f"{url} did not return a font file")
+    os.replace(tmp, path)  # atomic: a half-downloaded font is never picked up
+    return True
+
+def main():
+    FONT_DIR.mkdir(parents=True, exist_ok=True)
+    for name, url in FONTS.items():
+        try:
+            if fetch(name, url):
+                print(f"fetched {FONT_DIR / name}")
+        except (OSError, ValueError) as e:
+            print(f"could not fetch {name}: {e}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,73 +1,266 @@
-import os, sys, csv, requests
+import os, sys, time, random, argparse, threading, requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+
+try:
+    from . import sayings_store
+except ImportError:  # run as a script from this directory
+    import sayings_store
 
 CSV_PATH = os.getenv("CSV_PATH", "content/sayings.csv")
 REPO_OWNER = os.getenv("REPO_OWNER")
 REPO_NAME  = os.getenv("REPO_NAME")
 BRANCH     = os.getenv("BRANCH", "main")
 
+# When set (e.g. https://microsites-tool.onrender.com), Instagram fetches the image
+# from the tool runner's /render/justsaying/{id} instead of raw.githubusercontent.com.
+RENDER_BASE_URL = os.getenv("RENDER_BASE_URL", "").rstrip("/")
+
 IG_USER_ID = os.getenv("IG_USER_ID")
 PAGE_TOKEN = os.getenv("PAGE_TOKEN")
 
+# point at fake_graph_api.py (e.g. http://127.0.0.1:8765/v21.0) to run offline
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com/v21.0").rstrip("/")
+
+MAX_RETRIES = int(os.getenv("PUBLISH_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("PUBLISH_BACKOFF_BASE", "1.0"))    # seconds, doubled per retry
+POLL_INTERVAL = float(os.getenv("PUBLISH_POLL_INTERVAL", "2.0"))  # container status polling
+POLL_TIMEOUT = float(os.getenv("PUBLISH_POLL_TIMEOUT", "120"))
+CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "4"))
+RATE_PER_MIN = float(os.getenv("PUBLISH_RATE_PER_MIN", "20"))     # Graph API calls per minute
+
+# Graph API error codes documented as temporary (rate limits, service hiccups)
+TRANSIENT_CODES = {1, 2, 4, 17, 32, 341, 613}
+
 def raw_url(path_rel: str) -> str:
     # Use raw.githubusercontent.com (immediately public after push)
     return f"https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/{BRANCH}/{path_rel}"
 
-def set_status(row_id: str, new_status: str):
-    rows = []
-    with open(CSV_PATH, newline="", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
-    changed = False
-    for r in rows:
-        if r.get("id") == row_id:
-            r["status"] = new_status
-            changed = True
-            break
-    if changed:
-        with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=rows[0].keys())
-            w.writeheader()
-            w.writerows(rows)
+def render_url(row_id: str) -> str:
+    # Instagram only accepts JPEG images
+    return f"{RENDER_BASE_URL}/render/justsaying/{quote(row_id)}?format=jpeg"
+
+def set_status(store, row_id: str, new_status: str):
+    # updates the sayings store and writes the CSV (the committed source of truth) atomically
+    store.set_status(row_id, new_status, CSV_PATH)
+
+class GraphError(Exception):
+    def __init__(self, stage, message, transient=False):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        self.transient = transient
+
+class RateLimiter:
+    """Token bucket shared by all publishing threads."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, min(per_minute, CONCURRENCY))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Publisher:
+    """
+    Two-step Instagram publishing (media container, then media_publish) over
+    one pooled session, with exponential-backoff retries on transient
+    errors and container status polling before publishing.
+
+    media_publish is not idempotent, so it is never simply re-sent: after a
+    failed or timed-out attempt the container is polled again, and if it is
+    already PUBLISHED the post counts as done.
+    """
+
+    def __init__(self, ig_user_id=IG_USER_ID, token=PAGE_TOKEN, base=GRAPH_API_BASE,
+                 limiter=None, session=None, sleep=time.sleep):
+        self.ig_user_id, self.token, self.base = ig_user_id, token, base
+        self.limiter = limiter or RateLimiter(RATE_PER_MIN)
+        self.sleep = sleep
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(CONCURRENCY, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _call(self, stage, method, path, retries=MAX_RETRIES, **kwargs):
+        for attempt in range(retries + 1):
+            self.limiter.acquire()
+            try:
+                r = self.session.request(method, f"{self.base}/{path}", timeout=30, **kwargs)
+                err = self._error(stage, r)
+            except requests.RequestException as e:
+                err = GraphError(stage, str(e), transient=True)
+            if err is None:
+                try:
+                    return r.json()
+                except ValueError:
+                    # a 200 that is not JSON (e.g. a proxy's error page): retried like any hiccup
+                    err = GraphError(stage, f"unreadable response: {r.text[:200]}", transient=True)
+            if not err.transient or attempt == retries:
+                raise err
+            self._backoff(attempt)
+
+    def _backoff(self, attempt):
+        # full jitter keeps concurrent publishers from retrying in lockstep
+        self.sleep(random.uniform(0, BACKOFF_BASE * (2 ** attempt)))
+
+    @staticmethod
+    def _error(stage, r):
+        if r.status_code == 200:
+            return None
+        try:
+            error = r.json().get("error", {})
+        except ValueError:
+            error = {}
+        transient = (r.status_code >= 500 or r.status_code == 429
+                     or error.get("is_transient") is True or error.get("code") in TRANSIENT_CODES)
+        return GraphError(stage, f"{r.status_code} {r.text}", transient=transient)
+
+    def create_container(self, image_url, caption):
+        body = self._call("create", "POST", f"{self.ig_user_id}/media", data={
+            "image_url": image_url,
+            "caption": caption,
+            "access_token": self.token,
+        })
+        creation_id = body.get("id")
+        if not creation_id:
+            raise GraphError("create", f"No creation_id in response: {body}")
+        return creation_id
+
+    def container_status(self, creation_id):
+        body = self._call("status", "GET", creation_id, params={
+            "fields": "status_code",
+            "access_token": self.token,
+        })
+        return body.get("status_code")
+
+    def wait_ready(self, creation_id):
+        """Poll the container until Instagram has fetched and processed the image."""
+        deadline = time.monotonic() + POLL_TIMEOUT
+        while True:
+            status = self.container_status(creation_id)
+            if status in ("FINISHED", "PUBLISHED"):
+                return
+            if status in ("ERROR", "EXPIRED"):
+                raise GraphError("status", f"container {creation_id} is {status}")
+            if time.monotonic() > deadline:
+                raise GraphError("status", f"container {creation_id} not ready after {POLL_TIMEOUT:g}s")
+            self.sleep(POLL_INTERVAL)
+
+    def publish(self, creation_id):
+        """
+        The media id, or None when an earlier attempt turned out to have
+        published the container after all (the id is lost with its response).
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                body = self._call("publish", "POST", f"{self.ig_user_id}/media_publish", retries=0, data={
+                    "creation_id": creation_id,
+                    "access_token": self.token,
+                })
+                return body.get("id")
+            except GraphError as e:
+                if not e.transient or attempt == MAX_RETRIES:
+                    raise
+            # the request may have gone through even though the response did not
+            if self.container_status(creation_id) == "PUBLISHED":
+                return None
+            self._backoff(attempt)
+
+    def publish_post(self, image_url, caption):
+        creation_id = self.create_container(image_url, caption)
+        self.wait_ready(creation_id)
+        return self.publish(creation_id)
+
+def publish_many(publisher, posts, store, concurrency=CONCURRENCY):
+    """
+    Publish (row_id, image_url, caption) posts concurrently; each success is
+    marked published in `store` right away. Returns {row_id: media_id or the
+    exception that stopped that post}; one post failing never aborts the others.
+    """
+    def one(post):
+        row_id, image_url, caption = post
+        try:
+            media_id = publisher.publish_post(image_url, caption)
+        except Exception as e:
+            return row_id, e
+        try:
+            set_status(store, row_id, "published")
+        except Exception as e:
+            # live on Instagram but still queued here: say so, or the next run posts it again
+            return row_id, RuntimeError(f"published as media {media_id} but status not saved: {e}")
+        return row_id, media_id
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        return dict(pool.map(one, posts))
 
 def main():
     image_rel_path = os.getenv("IMAGE_REL_PATH")
     caption = os.getenv("CAPTION", "").strip()
     row_id = os.getenv("ROW_ID")
 
-    if not (image_rel_path and caption and row_id):
-        print("Missing env IMAGE_REL_PATH / CAPTION / ROW_ID", file=sys.stderr)
+    if not ((image_rel_path or RENDER_BASE_URL) and caption and row_id):
+        print("Missing env IMAGE_REL_PATH (or RENDER_BASE_URL) / CAPTION / ROW_ID", file=sys.stderr)
         return 1
 
-    img_url = raw_url(image_rel_path)
-    # Step 1: create media container
-    url1 = f"https://graph.facebook.com/v21.0/{IG_USER_ID}/media"
-    r1 = requests.post(url1, data={
-        "image_url": img_url,
-        "caption": caption,
-        "access_token": PAGE_TOKEN
-    }, timeout=30)
-    if r1.status_code != 200:
-        print(f"Create media failed: {r1.status_code} {r1.text}", file=sys.stderr)
-        return 2
-    creation_id = r1.json().get("id")
-    if not creation_id:
-        print(f"No creation_id in response: {r1.text}", file=sys.stderr)
-        return 3
-
-    # Step 2: publish
-    url2 = f"https://graph.facebook.com/v21.0/{IG_USER_ID}/media_publish"
-    r2 = requests.post(url2, data={
-        "creation_id": creation_id,
-        "access_token": PAGE_TOKEN
-    }, timeout=30)
-    if r2.status_code != 200:
-        print(f"Publish failed: {r2.status_code} {r2.text}", file=sys.stderr)
-        return 4
+    img_url = render_url(row_id) if RENDER_BASE_URL else raw_url(image_rel_path)
+    try:
+        Publisher().publish_post(img_url, caption)
+    except GraphError as e:
+        print(f"Publish failed at {e}", file=sys.stderr)
+        return {"create": 2, "status": 3, "publish": 4}.get(e.stage, 4)
 
     # mark as published
-    set_status(row_id, "published")
+    store = sayings_store.open_store(CSV_PATH)
+    try:
+        set_status(store, row_id, "published")
+    finally:
+        store.close()
     print("published=true")
     return 0
 
+def main_batch(limit=None):
+    """Publish every due queued row through the tool runner's render endpoint."""
+    if not RENDER_BASE_URL:
+        print("--batch needs RENDER_BASE_URL so each post has a fetchable image", file=sys.stderr)
+        return 1
+    try:
+        from .render_post import caption_for, today_str
+    except ImportError:  # run as a script from this directory
+        from render_post import caption_for, today_str
+
+    store = sayings_store.open_store(CSV_PATH)
+    try:
+        rows = store.due(today_str())[:limit]
+        posts = [(r["id"], render_url(r["id"]), caption_for(r)) for r in rows]
+        results = publish_many(Publisher(), posts, store)
+    finally:
+        store.close()
+    failed = 0
+    for row_id, outcome in results.items():
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"failed row_id={row_id} {outcome}", file=sys.stderr)
+        else:
+            print(f"published row_id={row_id} media_id={outcome}")
+    print(f"published_count={len(results) - failed}")
+    return 5 if failed else 0
+
 if __name__ == "__main__":
-    sys.exit(main())
+    parser = argparse.ArgumentParser(description="Publish rendered sayings to Instagram.")
+    parser.add_argument("--batch", action="store_true", help="publish all due queued rows concurrently")
+    parser.add_argument("--limit", type=int, default=None, help="at most this many posts with --batch")
+    args = parser.parse_args()
+    sys.exit(main_batch(args.limit) if args.batch else main())
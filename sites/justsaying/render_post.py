@@ -1,7 +1,13 @@
-import csv, os, textwrap, sys, datetime
+import os, textwrap, sys, datetime, argparse, functools, hashlib, io, json, shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    from . import sayings_store
+except ImportError:  # run as a script from this directory
+    import sayings_store
+
 PALETTE = {
     "bg": "#FFE5D4",      # warm sand
     "accent": "#694F5D",  # deep plum
@@ -11,80 +17,190 @@ PALETTE = {
 W, H = 1000, 1500
 M = 80  # margin
 TITLE_FS = 72
+MIN_TITLE_FS = 36  # long sayings shrink down to this before overflowing
 SUB_FS = 40
 CREDIT_FS = 28
 LINE_SPACING = 1.18
 
-FONT_SANS = "assets/fonts/NotoSans-Regular.ttf"
-FONT_SERIF = "assets/fonts/NotoSerif-Regular.ttf"
+def _asset(rel):
+    # relative to the working dir (CI), else next to this file (imported by the tool runner)
+    if os.path.exists(rel):
+        return rel
+    return str(Path(__file__).resolve().parent / rel)
+
+# The Noto fonts are not committed: fetch_fonts.py downloads them into
+# assets/fonts (the Render build does), or FONT_DIR points at a directory
+# that already has them.
+FONT_DIR = os.getenv("FONT_DIR", "")
+
+def _font(name):
+    return os.path.join(FONT_DIR, name) if FONT_DIR else _asset(f"assets/fonts/{name}")
+
+FONT_SANS = _font("NotoSans-Regular.ttf")
+FONT_SERIF = _font("NotoSerif-Regular.ttf")
 
 CSV_PATH = os.getenv("CSV_PATH", "content/sayings.csv")
 OUT_DIR = Path(os.getenv("OUT_DIR", "public/instagram"))
 
-def wrap(draw, text, font, max_width):
-    # simple greedy wrapper
+# output encoding: png (optimized), jpeg (progressive) or webp; with
+# OUT_MAX_BYTES > 0, jpeg/webp quality is searched to fit under that size
+OUT_FORMAT = os.getenv("OUT_FORMAT", "png").lower()
+OUT_MAX_BYTES = int(os.getenv("OUT_MAX_BYTES", "0"))
+FORMATS = {"png": ("PNG", "png"), "jpeg": ("JPEG", "jpg"), "webp": ("WEBP", "webp")}
+
+# rendered files by content hash; unchanged posts are copied from here instead of redrawn.
+# Kept in the user cache dir, outside OUT_DIR, which the workflow commits and publishes.
+RENDER_CACHE_DIR = Path(os.getenv(
+    "RENDER_CACHE_DIR",
+    str(Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "justsaying-renders"),
+))
+# bump when drawing code changes in a way the hashed inputs don't capture
+RENDER_VERSION = "1"
+
+FOOTER = "Spreekwoorden • @yourhandle"
+
+# FONT_FALLBACK=1 substitutes Pillow's bundled font for missing font files
+# (benchmarks, local runs); otherwise a missing font is an error, never a
+# post silently rendered in the wrong typeface.
+FONT_FALLBACK = os.getenv("FONT_FALLBACK", "") == "1"
+
+@functools.lru_cache(maxsize=None)
+def load_font(path, size):
+    # cached: truetype() re-reads and parses the font file on every call
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError as e:
+        if not FONT_FALLBACK:
+            raise OSError(f"font {Path(path).name} not readable ({e}); run fetch_fonts.py or set FONT_DIR") from e
+        print(f"warning: font {path} not readable, using Pillow's default font", file=sys.stderr)
+        return ImageFont.load_default(size=size)
+
+def fonts():
+    return (
+        load_font(FONT_SERIF, TITLE_FS),
+        load_font(FONT_SANS, SUB_FS),
+        load_font(FONT_SANS, CREDIT_FS),
+    )
+
+@functools.lru_cache(maxsize=1)
+def base_template():
+    """Background, accent bar, footer and frame: identical for every post, drawn once."""
+    im = Image.new("RGB", (W, H), PALETTE["bg"])
+    draw = ImageDraw.Draw(im)
+
+    # simple accent bar at top
+    draw.rectangle([0,0,W,18], fill=PALETTE["accent"])
+
+    # small footer / brand (edit as you like)
+    credit_font = fonts()[2]
+    fw, fh = draw.textlength(FOOTER, font=credit_font), credit_font.size
+    draw.text((W-M-fw, H-M-fh), FOOTER, font=credit_font, fill=PALETTE["ink"])
+
+    # subtle frame
+    draw.rectangle([M//2, M//2, W-M//2, H-M//2], outline=PALETTE["accent"], width=2)
+    return im
+
+# ---------- text layout ----------
+_widths = {}  # font -> {string: advance width}
+
+def measure(font, s):
+    """Advance width of `s` in `font`, cached per font."""
+    widths = _widths.get(font)
+    if widths is None:
+        widths = _widths[font] = {}
+    w = widths.get(s)
+    if w is None:
+        w = widths[s] = font.getlength(s)
+    return w
+
+# word + space widths can differ from the measured joined line by kerning;
+# estimates this close to the limit are re-measured exactly
+KERN_SLACK = 2.0
+
+@functools.lru_cache(maxsize=4096)
+def layout_lines(text, font, max_width):
+    """
+    Greedy word wrap as a tuple of lines. Lines are fitted incrementally from
+    cached word and space widths instead of re-measuring the growing line
+    for every word; memoized per (text, font, max_width).
+    """
     words = text.split()
-    lines, cur = [], []
+    space = measure(font, " ")
+    lines, cur, cur_w = [], [], 0.0
     for w in words:
-        test = " ".join(cur + [w])
-        if draw.textlength(test, font=font) <= max_width:
+        ww = measure(font, w)
+        if not cur:
+            cur, cur_w = [w], ww
+            continue
+        est = cur_w + space + ww
+        if est <= max_width - KERN_SLACK:
+            fits = True
+        elif est > max_width + KERN_SLACK:
+            fits = False
+        else:
+            est = font.getlength(" ".join(cur + [w]))
+            fits = est <= max_width
+        if fits:
             cur.append(w)
+            cur_w = est
         else:
-            if cur: lines.append(" ".join(cur))
-            cur = [w]
+            lines.append(" ".join(cur))
+            cur, cur_w = [w], ww
     if cur: lines.append(" ".join(cur))
-    return lines
+    return tuple(lines)
+
+def wrap(draw, text, font, max_width):
+    # simple greedy wrapper
+    return list(layout_lines(text, font, max_width))
+
+def block_height(text, font, max_width):
+    return len(layout_lines(text, font, max_width)) * font.size * LINE_SPACING
 
 def draw_text_block(draw, text, font, x, y, max_width, fill):
-    lines = wrap(draw, text, font, max_width)
+    lines = layout_lines(text, font, max_width)
     line_h = font.size * LINE_SPACING
     for i, line in enumerate(lines):
         draw.text((x, y + i*line_h), line, font=font, fill=fill)
     return y + len(lines)*line_h
 
-def pick_row(rows, today):
-    # choose first queued with date <= today (YYYY-MM-DD)
-    for r in rows:
-        if (r.get("status","").strip().lower() == "queued" and
-            r.get("date","") <= today):
-            return r
-    return None
+def fit_title_size(text, translation, max_width, max_height):
+    """
+    Largest title size in [MIN_TITLE_FS, TITLE_FS] whose block (plus the
+    translation) fits in max_height, found by binary search.
+    """
+    sub_h = block_height(translation, fonts()[1], max_width) + 16 if translation else 0
 
-def main():
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    def fits(size):
+        return block_height(text, load_font(FONT_SERIF, size), max_width) + 24 + sub_h <= max_height
 
-    # load data
-    with open(CSV_PATH, newline="", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
-    today = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=2))).strftime("%Y-%m-%d")  # Europe/Amsterdam (+02:00 in summer)
-    row = pick_row(rows, today)
-    if not row:
-        print("no_row=true", file=sys.stderr)
-        print("::notice title=Instagram::No queued row for today")
-        return 0
+    if fits(TITLE_FS):
+        return TITLE_FS
+    lo, hi = MIN_TITLE_FS, TITLE_FS - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
 
+def render_image(row):
+    """Draw one post onto a copy of the base template and return the image."""
     text = row["text"].strip()
     translation = row.get("translation","").strip()
-    hashtags = (row.get("hashtags","") or "").strip()
-    pid = row["id"].strip()
-    style = (row.get("image_style") or "classic").strip()
 
-    # canvas
-    im = Image.new("RGB", (W, H), PALETTE["bg"])
+    im = base_template().copy()
     draw = ImageDraw.Draw(im)
-
-    # simple accent bar at top
-    draw.rectangle([0,0,W,18], fill=PALETTE["accent"])
-
-    # load fonts
-    title_font = ImageFont.truetype(FONT_SERIF, TITLE_FS)
-    sub_font   = ImageFont.truetype(FONT_SANS, SUB_FS)
-    credit_font= ImageFont.truetype(FONT_SANS, CREDIT_FS)
+    _title_font, sub_font, _credit_font = fonts()
 
     # layout
     x = M
     y = int(H*0.18)
 
+    # shrink long sayings so they stop above the footer
+    room = H - M - CREDIT_FS - 24 - y
+    title_font = load_font(FONT_SERIF, fit_title_size(text, translation, W-2*M, room))
+
     # headline (Dutch saying)
     y = draw_text_block(draw, text, title_font, x, y, W-2*M, fill=PALETTE["ink"])
     y += 24
@@ -93,25 +209,103 @@ def main():
     if translation:
         y = draw_text_block(draw, translation, sub_font, x, y, W-2*M, fill=PALETTE["accent"])
         y += 16
+    return im
 
-    # small footer / brand (edit as you like)
-    footer = "Spreekwoorden • @yourhandle"
-    fw, fh = draw.textlength(footer, font=credit_font), credit_font.size
-    draw.text((W-M-fw, H-M-fh), footer, font=credit_font, fill=PALETTE["ink"])
-
-    # subtle frame
-    draw.rectangle([M//2, M//2, W-M//2, H-M//2], outline=PALETTE["accent"], width=2)
-
-    # save
-    out_name = f"{today}-{pid}.png"
-    out_path = OUT_DIR / out_name
-    im.save(out_path, format="PNG")
-
-    # caption
+def caption_for(row):
+    text = row["text"].strip()
+    translation = row.get("translation","").strip()
+    hashtags = (row.get("hashtags","") or "").strip()
     caption_parts = [text]
     if translation: caption_parts.append(f"Vertaling: {translation}")
     if hashtags: caption_parts.append(hashtags)
-    caption = "\n\n".join(caption_parts)
+    return "\n\n".join(caption_parts)
+
+# ---------- encoding & render cache ----------
+def encode_image(im, fmt=OUT_FORMAT, max_bytes=OUT_MAX_BYTES):
+    """Encode `im` as bytes in `fmt`; lossy formats search quality to fit max_bytes."""
+    pil_format, _ext = FORMATS[fmt]
+
+    def save(**opts):
+        buf = io.BytesIO()
+        im.save(buf, format=pil_format, **opts)
+        return buf.getvalue()
+
+    if fmt == "png":
+        return save(optimize=True)
+    opts = {"progressive": True, "optimize": True} if fmt == "jpeg" else {"method": 6}
+    best = save(quality=90, **opts)
+    if not max_bytes or len(best) <= max_bytes:
+        return best
+    # highest quality that still fits; falls back to the smallest we tried
+    lo, hi, best = 30, 89, None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = save(quality=q, **opts)
+        if len(data) <= max_bytes:
+            best, lo = data, q + 1
+        else:
+            hi = q - 1
+    return best if best is not None else save(quality=30, **opts)
+
+@functools.lru_cache(maxsize=1)
+def _assets_digest():
+    h = hashlib.sha256(RENDER_VERSION.encode())
+    h.update(json.dumps([PALETTE, W, H, M, TITLE_FS, MIN_TITLE_FS, SUB_FS, CREDIT_FS, LINE_SPACING, FOOTER]).encode())
+    for path in (FONT_SERIF, FONT_SANS):
+        try:
+            h.update(Path(path).read_bytes())
+        except OSError:
+            h.update(b"<pillow-default-font>")
+    return h.digest()
+
+def render_key(row, fmt=OUT_FORMAT, max_bytes=OUT_MAX_BYTES):
+    """Content hash of everything that affects the rendered file."""
+    h = hashlib.sha256(_assets_digest())
+    fields = [row["text"].strip(), row.get("translation","").strip(), fmt, max_bytes]
+    h.update(json.dumps(fields).encode())
+    return h.hexdigest()
+
+def render_row(row, day, fmt=OUT_FORMAT, max_bytes=OUT_MAX_BYTES):
+    """
+    Render `row` to OUT_DIR/<day>-<id>.<ext>; returns (path, cached). A
+    post whose inputs hash to an existing cache entry is not redrawn.
+    """
+    pid = row["id"].strip()
+    _pil_format, ext = FORMATS[fmt]
+    out_path = OUT_DIR / f"{day}-{pid}.{ext}"
+    cached = RENDER_CACHE_DIR / f"{render_key(row, fmt, max_bytes)}.{ext}"
+    hit = cached.exists()
+    if not hit:
+        RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(encode_image(render_image(row), fmt, max_bytes))
+        os.replace(tmp, cached)  # atomic: parallel workers never see half a file
+    if not (out_path.exists() and out_path.stat().st_size == cached.stat().st_size
+            and out_path.read_bytes() == cached.read_bytes()):
+        shutil.copyfile(cached, out_path)
+    return out_path, hit
+
+def _render_job(job):
+    row, day, fmt, max_bytes = job
+    return render_row(row, day, fmt, max_bytes)
+
+def today_str():
+    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=2))).strftime("%Y-%m-%d")  # Europe/Amsterdam (+02:00 in summer)
+
+def main(fmt=OUT_FORMAT, max_bytes=OUT_MAX_BYTES):
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # load data (indexed store, synced from the CSV)
+    today = today_str()
+    row = sayings_store.open_store(CSV_PATH).next_due(today)
+    if not row:
+        print("no_row=true", file=sys.stderr)
+        print("::notice title=Instagram::No queued row for today")
+        return 0
+
+    pid = row["id"].strip()
+    out_path, _cached = render_row(row, today, fmt, max_bytes)
+    caption = caption_for(row)
 
     # outputs for workflow
     print(f"image_rel_path={out_path.as_posix()}")
@@ -119,5 +313,39 @@ def main():
     print(f"row_id={pid}")
     return 0
 
+def main_batch(workers=1, fmt=OUT_FORMAT, max_bytes=OUT_MAX_BYTES):
+    """
+    Render every due queued row in one run (backfills). Each image is named
+    after its own date. Fonts and the base template are built once per
+    process; workers > 1 spreads rows over a process pool.
+    """
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    today = today_str()
+    due = sayings_store.open_store(CSV_PATH).due(today)
+    jobs = [(r, r.get("date") or today, fmt, max_bytes) for r in due]
+    if not jobs:
+        print("no_row=true", file=sys.stderr)
+        return 0
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        done = [_render_job(job) for job in jobs]
+
+    for job, (path, cached) in zip(jobs, done):
+        print(f"{'cached' if cached else 'rendered'}={path.as_posix()} row_id={job[0]['id'].strip()}")
+    print(f"rendered_count={sum(1 for _p, cached in done if not cached)}")
+    print(f"cached_count={sum(1 for _p, cached in done if cached)}")
+    return 0
+
 if __name__ == "__main__":
-    sys.exit(main())
+    parser = argparse.ArgumentParser(description="Render Instagram posts from the sayings CSV.")
+    parser.add_argument("--batch", action="store_true", help="render every due queued row, not just the first")
+    parser.add_argument("--workers", type=int, default=1, help="processes to use with --batch")
+    parser.add_argument("--format", choices=sorted(FORMATS), default=OUT_FORMAT, help="output encoding")
+    parser.add_argument("--max-bytes", type=int, default=OUT_MAX_BYTES, help="target file size for jpeg/webp")
+    args = parser.parse_args()
+    if args.batch:
+        sys.exit(main_batch(args.workers, args.format, args.max_bytes))
+    sys.exit(main(args.format, args.max_bytes))
@@ -0,0 +1,243 @@
+"""
+SQLite-backed store for the sayings archive.
+
+The CSV stays the source of truth (it is what the repository commits);
+the store is a disposable index over it by status and date, so picking
+the next post is a single indexed query instead of a full-file scan.
+Status changes are written to the store and then exported back to the
+CSV atomically. Rows without a date are never due.
+
+    python sayings_store.py import [CSV]     # (re)load content from the CSV
+    python sayings_store.py export [CSV]     # write rows back, original columns
+    python sayings_store.py status ID STATUS
+
+Both CSV layouts are understood: the archive's own columns
+(Number, LastUsed, Saying, TranslationLiteral, TranslationActual, ...)
+and the id/status/date/text columns the publishing scripts use.
+"""
+import csv, json, os, sqlite3, sys, threading
+from pathlib import Path
+
+CSV_PATH = os.getenv("CSV_PATH", "content/sayings.csv")
+SAYINGS_DB = os.getenv("SAYINGS_DB", str(Path(CSV_PATH).with_suffix(".db")))
+
+FIELDS = ("id", "status", "date", "text", "translation", "hashtags", "image_style")
+
+# archive CSV column -> store field; unmapped columns are kept in `extra`
+ARCHIVE_COLUMNS = {
+    "Number": "id",
+    "Saying": "text",
+    "TranslationActual": "translation",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sayings (
+    id          TEXT PRIMARY KEY,
+    position    INTEGER NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'queued',
+    date        TEXT NOT NULL DEFAULT '',
+    text        TEXT NOT NULL,
+    translation TEXT NOT NULL DEFAULT '',
+    hashtags    TEXT NOT NULL DEFAULT '',
+    image_style TEXT NOT NULL DEFAULT '',
+    extra       TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS sayings_due ON sayings (status, date, position);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def column_map(header):
+    """CSV header -> {column: field} for whichever layout the file uses."""
+    if "Number" in header:
+        # the archive has no status/date columns of its own; they are added on export when used
+        return {col: ARCHIVE_COLUMNS.get(col, col) for col in header if col in ARCHIVE_COLUMNS or col in ("status", "date")}
+    return {col: col for col in header if col in FIELDS}
+
+
+def _to_record(raw, mapping, position):
+    rec = {field: "" for field in FIELDS}
+    extra = {}
+    for col, value in raw.items():
+        if col in mapping:
+            rec[mapping[col]] = (value or "").strip()
+        elif col is not None:
+            extra[col] = value
+    rec["status"] = rec["status"].lower() or "queued"
+    rec["position"] = position
+    rec["extra"] = json.dumps(extra, ensure_ascii=False)
+    return rec
+
+
+class SayingsStore:
+    def __init__(self, path=SAYINGS_DB):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # one connection shared by the runner's worker threads, serialized by a lock
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # ---------- import / export ----------
+    def import_csv(self, csv_path=CSV_PATH):
+        """
+        Stream rows from the CSV into the store in one transaction. The CSV
+        is authoritative: every column, status included, replaces what the
+        store held (status changes reach the CSV through set_status first),
+        and rows no longer in the file are dropped.
+        """
+        with open(csv_path, newline="", encoding="utf-8") as f, self._lock:
+            reader = csv.DictReader(f)
+            mapping = column_map(reader.fieldnames or [])
+            if "id" not in mapping.values() or "text" not in mapping.values():
+                raise ValueError(f"{csv_path}: no id/text columns in {reader.fieldnames}")
+            records = (_to_record(raw, mapping, i) for i, raw in enumerate(reader))
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # deleted rows must not stay due, nor keep positions that collide with the new ones
+                self._db.execute("DELETE FROM sayings")
+                self._db.executemany(
+                    """
+                    INSERT INTO sayings (id, position, status, date, text, translation, hashtags, image_style, extra)
+                    VALUES (:id, :position, :status, :date, :text, :translation, :hashtags, :image_style, :extra)
+                    ON CONFLICT(id) DO UPDATE SET
+                        status = excluded.status, position = excluded.position, date = excluded.date, text = excluded.text,
+                        translation = excluded.translation, hashtags = excluded.hashtags,
+                        image_style = excluded.image_style, extra = excluded.extra
+                    """,
+                    records,
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("header", json.dumps(reader.fieldnames)),
+                     ("csv_mtime", repr(os.stat(csv_path).st_mtime))],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def sync(self, csv_path=CSV_PATH):
+        """Import the CSV if it changed since the last import."""
+        try:
+            mtime = repr(os.stat(csv_path).st_mtime)
+        except OSError:
+            return
+        if self._meta("csv_mtime") != mtime:
+            self.import_csv(csv_path)
+
+    def export_csv(self, csv_path=CSV_PATH):
+        """
+        Stream all rows back out under the header of the last import (plus
+        status/date columns if the file had none and rows now need them),
+        replacing the file atomically. Refuses (ValueError) if the store has
+        never imported a CSV, rather than overwrite one with an empty table.
+        """
+        # held throughout, so threads sharing the store never interleave on the tmp file
+        with self._lock:
+            header = self._meta("header")
+            if header is None:
+                raise ValueError(f"{self.path} has never imported a CSV; not overwriting {csv_path}")
+            header = json.loads(header)
+            for field, default in (("status", "queued"), ("date", "")):
+                if field not in column_map(header).values() and self._db.execute(
+                    f"SELECT 1 FROM sayings WHERE {field} != ? LIMIT 1", (default,)
+                ).fetchone():
+                    header.append(field)
+            mapping = column_map(header)
+            tmp = f"{csv_path}.tmp"
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=header, quoting=csv.QUOTE_ALL, extrasaction="ignore", lineterminator="\n")
+                w.writeheader()
+                for row in self._db.execute("SELECT * FROM sayings ORDER BY position"):
+                    out = json.loads(row["extra"])
+                    for col, field in mapping.items():
+                        out[col] = row[field]
+                    w.writerow(out)
+            os.replace(tmp, csv_path)
+            # the CSV now matches the store; don't re-import it on the next sync
+            self._db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("header", json.dumps(header)), ("csv_mtime", repr(os.stat(csv_path).st_mtime))],
+            )
+
+    # ---------- queries ----------
+    def get(self, row_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM sayings WHERE id = ?", (row_id,)).fetchone()
+        return dict(row) if row else None
+
+    def next_due(self, today):
+        """First queued row (in CSV order) with a date <= today (YYYY-MM-DD)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM sayings WHERE status = 'queued' AND date != '' AND date <= ? ORDER BY position LIMIT 1",
+                (today,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def due(self, today):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM sayings WHERE status = 'queued' AND date != '' AND date <= ? ORDER BY position",
+                (today,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def set_status(self, row_id, status, csv_path=CSV_PATH):
+        """
+        Change one row's status and write it through to `csv_path` (skipped
+        when None); returns False if the id is unknown.
+        """
+        with self._lock:
+            cur = self._db.execute("UPDATE sayings SET status = ? WHERE id = ?", (status.strip().lower(), row_id))
+        if cur.rowcount != 1:
+            return False
+        if csv_path:
+            self.export_csv(csv_path)
+        return True
+
+
+def open_store(csv_path=CSV_PATH, db_path=SAYINGS_DB):
+    """Open the store and pull in any CSV edits since the last run."""
+    store = SayingsStore(db_path)
+    store.sync(csv_path)
+    return store
+
+
+def main(argv):
+    if not argv or argv[0] not in ("import", "export", "status"):
+        print(__doc__, file=sys.stderr)
+        return 1
+    cmd, args = argv[0], argv[1:]
+    csv_path = args[0] if args and cmd != "status" else CSV_PATH
+    store = SayingsStore()
+    try:
+        # synced first: on a fresh checkout the (gitignored) database does not exist yet
+        store.sync(csv_path)
+        if cmd == "import":
+            store.import_csv(csv_path)
+        elif cmd == "export":
+            store.export_csv(csv_path)
+        elif not store.set_status(args[0], args[1], CSV_PATH):
+            print(f"unknown id {args[0]}", file=sys.stderr)
+            return 1
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
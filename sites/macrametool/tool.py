@@ -1,6 +1,18 @@
+import json
 import math
+from fractions import Fraction
 from typing import Any, Dict, Tuple
 
+from runner.timing import stage
+from runner.validation import SchemaValidator
+
+# Pure function of params: the runner may memoize results.
+CACHEABLE = True
+# Idempotent: identical concurrent requests may share one run.
+COALESCE = True
+# run(mode='schema') returns SCHEMA_JSON bytes that the runner sends as-is.
+PRESERIALIZED = True
+
 # ---------- core compute ----------
 def calculate_outcome(data) -> dict:
     sample = data["sample"]
@@ -73,7 +85,20 @@ def calculate_outcome(data) -> dict:
 
 
     
-    uom = settings["uom"]
+    return _format_outcome(
+        settings["uom"],
+        number_of_cords,
+        final_length_per_cord,
+        final_total_rope_length,
+        total_rope_needed,
+        actual_width,
+        rope_consumption_ratio,
+        target_k_length,
+    )
+
+def _format_outcome(uom, number_of_cords, final_length_per_cord, final_total_rope_length,
+                    total_rope_needed, actual_width, rope_consumption_ratio, target_k_length) -> dict:
+    """Round and label raw quantities; shared by the scalar and sweep paths."""
     if uom == "cm":
         uom_converted = "m"
         total_rope_converted = round(total_rope_needed / 100.0, 2)
@@ -95,19 +120,235 @@ def calculate_outcome(data) -> dict:
             },
     }
 
+# ---------- sweep (many targets in one pass) ----------
+SWEEP_AXES = [
+    ("target", "total_length"),
+    ("target", "min_width"),
+    ("settings", "safety_margin"),
+]
+
+MAX_SWEEP_POINTS = 5000
+
+def _expand_axis(spec) -> list:
+    """
+    A sweep axis is a single number, a list of numbers, or an inclusive
+    range given as {"start": .., "stop": .., "step": ..}.
+    """
+    if isinstance(spec, dict):
+        start, stop, step = spec.get("start"), spec.get("stop"), spec.get("step", 1)
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (start, stop, step)):
+            raise ValueError("range needs numeric start, stop and step")
+        if any(isinstance(v, float) and not math.isfinite(v) for v in (start, stop, step)):
+            raise ValueError("range needs finite start, stop and step")
+        if step <= 0 or stop < start:
+            raise ValueError("range needs step > 0 and stop >= start")
+        try:
+            steps = (stop - start) / step + 1e-9
+        except OverflowError:  # ints too large for a float quotient
+            steps = math.inf
+        # checked before floor(): a huge span over a tiny step overflows to inf
+        if not steps < MAX_SWEEP_POINTS:
+            raise ValueError("range has too many points")
+        return [start + i * step for i in range(int(math.floor(steps)) + 1)]
+    values = spec if isinstance(spec, list) else [spec]
+    if not values:
+        raise ValueError("empty list")
+    for v in values:
+        if not isinstance(v, (int, float)) or isinstance(v, bool):
+            raise ValueError("values must be numbers")
+    return values
+
+def calculate_sweep(data, axes) -> list:
+    """
+    Vectorised calculate_outcome over the cartesian product of `axes`
+    (values for target.total_length, target.min_width, settings.safety_margin).
+    The arithmetic mirrors calculate_outcome operation-for-operation so the
+    rounded results are identical to the scalar path.
+    """
+    import numpy as np
+
+    sample = data["sample"]
+    uom = data["settings"]["uom"]
+
+    total_length = np.asarray(axes[0]).reshape(-1, 1, 1)
+    min_width = np.asarray(axes[1]).reshape(1, -1, 1)
+    safety_margin = np.asarray(axes[2]).reshape(1, 1, -1)
+    if any(a.dtype.kind not in "iuf" for a in (total_length, min_width, safety_margin)):
+        # ints beyond int64 become object arrays, which numpy's ufuncs refuse; Python ints cope
+        return _sweep_scalar(data, axes)
+    shape = (total_length.shape[0], min_width.shape[1], safety_margin.shape[2])
+
+    # sample-only quantities stay Python scalars, exactly as in calculate_outcome
+    rope_consumption_ratio = (
+        (sample["rope_used"] - sample["attached_length"] - (2 * sample["fringe_length"]))
+        / sample["k_length"]
+    )
+    fringe_length = sample["fringe_length"]
+    attached_length = sample["attached_length"]
+
+    target_k_length = total_length - fringe_length
+    base_rope_for_knotting = target_k_length * rope_consumption_ratio
+    total_rope_per_cord = base_rope_for_knotting + (2 * fringe_length) + attached_length
+    total_rope_vertical = total_rope_per_cord * sample["ropes"]
+
+    with np.errstate(all="ignore"):
+        actual_width_multiplier = np.ceil(min_width / sample["width"])
+        if not (np.isfinite(actual_width_multiplier) & (np.abs(actual_width_multiplier) < 2 ** 53)).all():
+            # division by zero or beyond int64: the scalar path raises (or copes) exactly as a request would
+            return _sweep_scalar(data, axes)
+        actual_width_multiplier = actual_width_multiplier.astype(np.int64)
+        actual_width = actual_width_multiplier * sample["width"]
+        total_rope_needed = total_rope_vertical * actual_width_multiplier
+        number_of_cords = total_rope_needed / total_rope_per_cord
+
+        safety_multiplier = 1 + (safety_margin / 100.0)
+        final_length_per_cord = total_rope_per_cord * safety_multiplier
+        final_total_rope_length = total_rope_needed * safety_multiplier
+    if not all(np.isfinite(a).all() for a in (number_of_cords, final_length_per_cord, final_total_rope_length)):
+        return _sweep_scalar(data, axes)
+
+    def flat(arr):
+        return np.broadcast_to(arr, shape).ravel().tolist()
+
+    columns = zip(
+        flat(total_length), flat(min_width), flat(safety_margin),
+        flat(number_of_cords), flat(final_length_per_cord), flat(final_total_rope_length),
+        flat(total_rope_needed), flat(actual_width), flat(target_k_length),
+    )
+    results = []
+    for tl, mw, sm, cords, per_cord, total, needed, width, k_len in columns:
+        row = {"target.total_length": tl, "target.min_width": mw, "settings.safety_margin": sm}
+        row.update(_format_outcome(uom, cords, per_cord, total, needed, width, rope_consumption_ratio, k_len))
+        results.append(row)
+    return results
+
+def _sweep_scalar(data, axes) -> list:
+    """calculate_outcome point by point; the fallback for inputs numpy cannot represent exactly."""
+    results = []
+    for tl in axes[0]:
+        for mw in axes[1]:
+            for sm in axes[2]:
+                row = {"target.total_length": tl, "target.min_width": mw, "settings.safety_margin": sm}
+                row.update(calculate_outcome({
+                    "sample": data["sample"],
+                    "target": {**data["target"], "total_length": tl, "min_width": mw},
+                    "settings": {**data["settings"], "safety_margin": sm},
+                }))
+                results.append(row)
+    return results
+
+# ---------- solve (largest target that fits a rope budget) ----------
+SOLVE_FOR = ("total_length", "min_width")
+
+# The budget is in the input unit, like total_rope_length (e.g. 50 m -> 5000 cm).
+SOLVE_SCHEMA = [
+    ("target", "rope_budget", "number", True, "Rope available, safety margin included (in input unit)", {"gt": 0}),
+]
+
+def solve_budget(data, budget, solve_for) -> dict:
+    """
+    Largest target.<solve_for> whose final_total_rope_length fits `budget`,
+    the other target value held fixed. The total rope is
+
+        ((L - fringe) * ratio + 2 * fringe + attached) * ropes * ceil(W / width) * safety
+
+    which is linear in the length L, so that is inverted directly (and
+    floored to the 0.1 shown in results). The width W only enters through
+    the ceil multiplier, so the largest affordable multiplier and the widest
+    whole W it allows are derived in exact (Fraction) arithmetic; budgets
+    beyond 2**53 sample widths are refused rather than approximated.
+    """
+    sample, target, settings = data["sample"], data["target"], data["settings"]
+    ratio = (sample["rope_used"] - sample["attached_length"] - (2 * sample["fringe_length"])) / sample["k_length"]
+    fringe, attached = sample["fringe_length"], sample["attached_length"]
+    safety = 1 + (settings["safety_margin"] / 100.0)
+    per_sample = sample["ropes"] * safety  # rope factor for one repeat of the sample width
+
+    def per_cord(length):
+        return (length - fringe) * ratio + (2 * fringe) + attached
+
+    if isinstance(budget, float) and not math.isfinite(budget):
+        raise ValueError("rope_budget must be a finite number")
+
+    if solve_for == "total_length":
+        if ratio <= 0:
+            raise ValueError("sample.rope_used must exceed the attachment and fringes")
+        multiplier = math.ceil(target["min_width"] / sample["width"])
+        length = fringe + (budget / (per_sample * multiplier) - (2 * fringe) - attached) / ratio
+        length = math.floor(round(length * 10, 9)) / 10
+        if length <= fringe:
+            needed = per_cord(fringe) * per_sample * multiplier
+            return {"ok": False, "error": f"Rope budget too small: this width needs more than {needed:.1f}"}
+        solved = {"total_length": length, "min_width": target["min_width"]}
+    else:
+        rope_per_multiple = per_cord(target["total_length"]) * per_sample
+        if not rope_per_multiple > 0:
+            raise ValueError("sample and target give no rope per cord")
+        if not math.isfinite(rope_per_multiple):
+            raise ValueError("sample and target need more rope per cord than can be represented")
+        # exact, so no float rounding to correct for (stepping by 1 stalls once floats exceed 2**53)
+        multiples = Fraction(budget) / Fraction(rope_per_multiple)
+        if multiples >= 2 ** 53:
+            raise ValueError("rope_budget is too large for this sample (over 2**53 sample widths)")
+        max_multiplier = math.floor(multiples)
+        if max_multiplier < 1:
+            return {"ok": False, "error": f"Rope budget too small: this length needs at least {rope_per_multiple:.1f}"}
+        # largest whole min_width with ceil(min_width / width) <= max_multiplier, i.e. min_width <= max_multiplier * width
+        width = math.floor(max_multiplier * Fraction(sample["width"]))
+        # calculate_outcome divides in floats; at most one step settles any rounding
+        if width >= 1 and math.ceil(width / sample["width"]) > max_multiplier:
+            width -= 1
+        if width < 1:
+            return {"ok": False, "error": "Rope budget too small for a whole-number width"}
+        solved = {"total_length": target["total_length"], "min_width": width}
+
+    result = calculate_outcome({"sample": sample, "target": dict(solved), "settings": settings})
+    used = per_cord(solved["total_length"]) * per_sample * math.ceil(solved["min_width"] / sample["width"])
+    return {
+        "ok": True,
+        "mode": "solve",
+        "solve_for": solve_for,
+        "target": solved,
+        "rope_budget": budget,
+        "rope_left": round(budget - used, 1),
+        "result": result,
+    }
+
+# Exercised once at startup so the first real request finds everything warm
+# (the sweep entry also pulls in numpy).
+WARMUP_PARAMS = [
+    {"mode": "schema"},
+    {
+        "sample": {"k_length": 10, "rope_used": 44, "width": 4, "ropes": 8, "attached_length": 4, "fringe_length": 2},
+        "target": {"total_length": 100, "min_width": 6},
+        "settings": {"safety_margin": 10, "uom": "cm"},
+    },
+    {
+        "mode": "sweep",
+        "sample": {"k_length": 10, "rope_used": 44, "width": 4, "ropes": 8, "attached_length": 4, "fringe_length": 2},
+        "target": {"total_length": [50, 100], "min_width": [4, 8]},
+        "settings": {"safety_margin": 10, "uom": "cm"},
+    },
+]
+
 # ---------- helpers for Framer binding .---------
 INPUT_SCHEMA = [
-    # section, key, type, required, hint
-    ("sample", "k_length", "number", True, "Knotting length of the sample"),
+    # section, key, type, required, hint[, constraints]
+    ("sample", "k_length", "number", True, "Knotting length of the sample", {"gt": 0}),
     ("sample", "rope_used", "number", True, "Total rope used in sample (includes attachment + fringes)"),
-    ("sample", "width", "number", True, "Sample width"),
-    ("sample", "ropes", "integer", True, "Number of cords used in sample"),
+    ("sample", "width", "number", True, "Sample width", {"gt": 0}),
+    ("sample", "ropes", "integer", True, "Number of cords used in sample", {"gt": 0}),
     ("sample", "attached_length", "number", True, "Attachment length included in sample.rope_used"),
     ("sample", "fringe_length", "number", True, "Fringe length per rope end included in sample.rope_used"),
     ("target", "total_length", "number", True, "Final total length"), 
     ("target", "min_width", "integer", True, "minimum width the project should have")
 ]
 
+SETTINGS_SCHEMA = [
+    ("settings", "safety_margin", "number", True, "Safety margin in %"),
+    ("settings", "uom", "select", True, "cm or in", {"options": ["cm", "in"]}),
+]
+
 OUTPUT_SCHEMA = [
     ("number_of_ropes", "integer", "Calculated total ropes"),
     ("length_per_rope", "number", "Per-rope length (in input unit)"),
@@ -120,6 +361,34 @@ OUTPUT_SCHEMA = [
     ("calculation_breakdown.target_k_length", "number", "Knotting length for target (vertical)"),
     ]
 
+# Built once at import; served by run(mode='schema') and the runner's GET /schema/{site}.
+SCHEMA = {
+    "ok": True,
+    "mode": "schema",
+    "inputs": [
+        {
+            "id": f"{sec}.{key}",
+            "section": sec,
+            "key": key,
+            "type": typ,
+            "required": req,
+            "hint": hint,
+            **({"options": rest[0]["options"]} if rest and "options" in rest[0] else {}),
+        }
+        for (sec, key, typ, req, hint, *rest) in INPUT_SCHEMA + SETTINGS_SCHEMA
+    ],
+    "outputs": [
+        {"id": field, "type": typ, "hint": hint}
+        for (field, typ, hint) in OUTPUT_SCHEMA
+    ],
+}
+
+SCHEMA_JSON = json.dumps(SCHEMA, separators=(",", ":")).encode()
+
+# Compiled once: denests, coerces and checks every field in a single pass.
+VALIDATOR = SchemaValidator(INPUT_SCHEMA + SETTINGS_SCHEMA)
+SOLVE_VALIDATOR = SchemaValidator(SOLVE_SCHEMA)
+
 def _denest_params(params: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
     """Allow either nested dicts or flat keys like 'sample.k_length'."""
     if all(isinstance(v, dict) for v in params.values() if v is not None):
@@ -139,74 +408,99 @@ def _denest_params(params: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
     return {"sample": sample, "target": target, "settings": settings}
 
 def _validate(data: Dict[str, Dict[str, Any]]) -> Tuple[bool, str]:
-    # required sections
-    for sec in ("sample", "target", "settings"):
-        if sec not in data or not isinstance(data[sec], dict):
-            return False, f"Missing or invalid section: {sec}"
-
-    # required fields
-    required = [(s, k) for (s, k, _t, req, _h) in INPUT_SCHEMA if req]
-    for s, k in required:
-        if data[s].get(k) in (None, ""):
-            return False, f"Missing required field"
-            # this one is more specific but is confusing to the end user since it uses intermediate fields: return False, f"Missing required field: {s}.{k}"
-
-    # unit & types (light)
-    if data["settings"].get("uom") not in ("cm", "in"):
-        return False, "settings.uom must be 'cm' or 'in'"
-
-    # numeric sanity (examples)
-    try:
-        if float(data["sample"]["k_length"]) <= 0:
-            return False, "sample.k_length must be > 0"
-        if int(data["sample"]["ropes"]) <= 0:
-            return False, "sample.ropes must be > 0"
-    except Exception:
-        return False, "Numeric fields must be filled out and contain valid numbers"
-
+    _typed, errors = VALIDATOR.validate(data)
+    if errors:
+        return False, errors[0]["error"]
     return True, ""
 
 def run(params: dict) -> dict:
     """
     Modes:
       - mode='schema'  -> returns input/output descriptors for Framer wiring
+                          (as pre-serialized JSON bytes, see SCHEMA_JSON)
       - mode='compute' -> (default) compute result from provided params
+      - mode='sweep'   -> like compute, but target.total_length, target.min_width
+                          and settings.safety_margin may be lists or
+                          {"start", "stop", "step"} ranges; returns the full grid
+      - mode='solve'   -> with target.rope_budget and solve_for='total_length'
+                          (or 'min_width'), returns the largest value of that
+                          target that fits the budget, the other one fixed
     Accepts nested dicts or flat keys like 'sample.k_length'.
     """
     mode = params.get("mode", "compute")
 
     if mode == "schema":
+        return SCHEMA_JSON
+
+    if mode == "sweep":
+        data = _denest_params({k: v for k, v in params.items() if k != "mode"})
+        axes = []
+        for sec, key in SWEEP_AXES:
+            section = data.get(sec)
+            if not isinstance(section, dict) or section.get(key) in (None, ""):
+                return {"ok": False, "error": "Missing required field"}
+            try:
+                values = _expand_axis(section[key])
+            except ValueError as e:
+                return {"ok": False, "error": f"{sec}.{key}: {e}"}
+            for v in values:
+                _value, error = VALIDATOR.check(f"{sec}.{key}", v)
+                if error:
+                    return {"ok": False, "error": error}
+            axes.append(values)
+        points = len(axes[0]) * len(axes[1]) * len(axes[2])
+        if points > MAX_SWEEP_POINTS:
+            return {"ok": False, "error": f"Sweep too large ({points} points, max {MAX_SWEEP_POINTS})"}
+
+        # validate the fixed inputs using the first point of each axis
+        probe = {sec: dict(data.get(sec) or {}) for sec in ("sample", "target", "settings")}
+        for (sec, key), values in zip(SWEEP_AXES, axes):
+            probe[sec][key] = values[0]
+        with stage("validate"):
+            typed, errors = VALIDATOR.validate(probe)
+        if errors:
+            return {"ok": False, "error": errors[0]["error"], "errors": errors}
+
+        try:
+            with stage("compute"):
+                results = calculate_sweep(typed, axes)
+        except Exception as e:
+            return {"ok": False, "error": f"Computation failed: {e}"}
         return {
             "ok": True,
-            "mode": "schema",
-            "inputs": [
-                {
-                    "id": f"{sec}.{key}",
-                    "section": sec,
-                    "key": key,
-                    "type": typ,
-                    "required": req,
-                    "hint": hint,
-                }
-                for (sec, key, typ, req, hint) in INPUT_SCHEMA
-            ] + [
-                {"id": "settings.safety_margin", "section": "settings", "key": "safety_margin", "type": "number", "required": True, "hint": "Safety margin in %"},
-                {"id": "settings.uom", "section": "settings", "key": "uom", "type": "select", "required": True, "hint": "cm or in", "options": ["cm", "in"]},
-            ],
-            "outputs": [
-                {"id": field, "type": typ, "hint": hint}
-                for (field, typ, hint) in OUTPUT_SCHEMA
-            ],
+            "mode": "sweep",
+            "axes": {f"{sec}.{key}": values for (sec, key), values in zip(SWEEP_AXES, axes)},
+            "shape": [len(values) for values in axes],
+            "results": results,
         }
 
+    if mode == "solve":
+        solve_for = params.get("solve_for")
+        if solve_for not in SOLVE_FOR:
+            return {"ok": False, "error": "solve_for must be 'total_length' or 'min_width'"}
+        with stage("validate"):
+            data, errors = VALIDATOR.validate(params)
+            # the free variable is the answer, not an input
+            errors = [e for e in errors if e["field"] != f"target.{solve_for}"]
+            budget, budget_errors = SOLVE_VALIDATOR.validate(params)
+            errors += budget_errors
+        if errors:
+            return {"ok": False, "error": errors[0]["error"], "errors": errors}
+        try:
+            with stage("compute"):
+                return solve_budget(data, budget["target"]["rope_budget"], solve_for)
+        except Exception as e:
+            return {"ok": False, "error": f"Computation failed: {e}"}
+
     # compute mode
-    data = _denest_params(params)
-    ok, msg = _validate(data)
-    if not ok:
-        return {"ok": False, "error": msg}
+    with stage("validate"):
+        data, errors = VALIDATOR.validate(params)
+    if errors:
+        return {"ok": False, "error": errors[0]["error"], "errors": errors}
 
     try:
-        result = calculate_outcome(data)
+        with stage("compute"):
+            result = calculate_outcome(data)
         return {"ok": True, "result": result}
     except Exception as e:
         return {"ok": False, "error": f"Computation failed: {e}"}
@@ -0,0 +1,85 @@
+"""
+mode='solve' against the forward formula: the solved target must fit the
+rope budget and the next step up must not.
+"""
+import math
+import random
+
+import pytest
+
+from sites.macrametool import tool
+
+SAMPLE = {"k_length": 10, "rope_used": 44, "width": 4, "ropes": 8, "attached_length": 4, "fringe_length": 2}
+SETTINGS = {"safety_margin": 10, "uom": "cm"}
+
+
+def rope_for(sample, settings, total_length, min_width):
+    """final_total_rope_length before rounding, as calculate_outcome computes it."""
+    ratio = (sample["rope_used"] - sample["attached_length"] - 2 * sample["fringe_length"]) / sample["k_length"]
+    per_cord = (total_length - sample["fringe_length"]) * ratio + 2 * sample["fringe_length"] + sample["attached_length"]
+    safety = 1 + settings["safety_margin"] / 100.0
+    return per_cord * sample["ropes"] * math.ceil(min_width / sample["width"]) * safety
+
+
+def solve(solve_for, budget, sample=SAMPLE, settings=SETTINGS, **target):
+    return tool.run({
+        "mode": "solve",
+        "solve_for": solve_for,
+        "sample": sample,
+        "target": {**target, "rope_budget": budget},
+        "settings": settings,
+    })
+
+
+def random_case(rng):
+    fringe = rng.choice([0, 1, 2.5, 5])
+    attached = rng.choice([0, 2, 4, 10])
+    sample = {
+        "k_length": rng.choice([5, 10, 12.5, 30]),
+        "rope_used": 0,
+        "width": rng.choice([0.5, 1, 3, 4, 7.5, 12]),
+        "ropes": rng.randint(1, 40),
+        "attached_length": attached,
+        "fringe_length": fringe,
+    }
+    sample["rope_used"] = attached + 2 * fringe + sample["k_length"] * rng.uniform(1.5, 6)
+    settings = {"safety_margin": rng.choice([0, 5, 10, 25]), "uom": "cm"}
+    return sample, settings
+
+
+def test_min_width_is_the_widest_that_fits():
+    rng = random.Random(1)
+    for _ in range(500):
+        sample, settings = random_case(rng)
+        total_length = rng.choice([20, 50, 100, 180.5])
+        budget = rng.uniform(1, 1e6)
+        out = solve("min_width", budget, sample, settings, total_length=total_length)
+        if not out["ok"]:
+            assert rope_for(sample, settings, total_length, 1) > budget * (1 - 1e-12)
+            continue
+        width = out["target"]["min_width"]
+        assert rope_for(sample, settings, total_length, width) <= budget * (1 + 1e-12)
+        assert rope_for(sample, settings, total_length, width + 1) > budget * (1 - 1e-12)
+
+
+def test_total_length_is_the_longest_that_fits():
+    rng = random.Random(2)
+    for _ in range(500):
+        sample, settings = random_case(rng)
+        min_width = rng.randint(1, 200)
+        budget = rng.uniform(1, 1e6)
+        out = solve("total_length", budget, sample, settings, min_width=min_width)
+        if not out["ok"]:
+            continue
+        length = out["target"]["total_length"]
+        assert rope_for(sample, settings, length, min_width) <= budget * (1 + 1e-9)
+        assert rope_for(sample, settings, round(length + 0.1, 1), min_width) > budget * (1 - 1e-9)
+
+
+@pytest.mark.parametrize("budget", [1e15, 1e30, 1e300, 10 ** 400, "inf", "nan"])
+def test_large_or_non_finite_budgets_return_promptly(budget):
+    out = solve("min_width", budget, total_length=100)
+    if budget == 1e15:
+        assert out["ok"] and out["target"]["min_width"] > 0
+    else:
+        assert out["ok"] is False